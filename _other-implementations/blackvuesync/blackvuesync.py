@@ -18,20 +18,24 @@
 __version__ = "1.8a"
 
 import argparse
+import concurrent.futures
+import contextlib
 import datetime
-from collections import namedtuple
+from collections import deque, namedtuple
 import fcntl
 import glob
 import http.client
+import json
 import logging
 import re
 import os
 import shutil
 import stat
+import threading
 import time
 import urllib
+import urllib.error
 import urllib.parse
-import urllib.request
 import socket
 
 # logging
@@ -66,9 +70,25 @@ max_disk_used_percent = None
 # socket timeout
 socket_timeout = None
 
+# number of files downloaded at the same time
+concurrency = None
+
 # indicator that we're doing a dry run
 dry_run = None
 
+# filenames of the files of the current dashcam recordings, once listed; their incomplete downloads are kept to be
+# resumed
+current_dashcam_filenames = None
+
+# index of the files downloaded to the destination; if none, the destination is checked directly
+destination_index = None
+
+# transfer telemetry of the sync, if any
+telemetry = None
+
+# token bucket capping the download bandwidth, if any
+bandwidth_limiter = None
+
 # keep and cutoff date; only recordings from this date on are downloaded and kept
 keep_re = re.compile(r"""(?P<range>\d+)(?P<unit>[dw]?)""")
 cutoff_date = None
@@ -155,19 +175,125 @@ def get_filenames(file_lines):
     return filenames
 
 
+class ConnectionPool:
+    """persistent HTTP/1.1 connections to a dashcam, shared by the download threads, so that each file, however small,
+    does not pay for a connection of its own"""
+
+    def __init__(self, host):
+        self.host = host
+        self.idle_connections = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """returns an idle connection, or a new one, and whether it is reused"""
+        with self.lock:
+            if self.idle_connections:
+                return self.idle_connections.pop(), True
+
+        # the timeout is the socket default timeout
+        return http.client.HTTPConnection(self.host), False
+
+    def release(self, connection):
+        """makes a connection whose response was read in full available for the next request"""
+        with self.lock:
+            self.idle_connections.append(connection)
+
+    @contextlib.contextmanager
+    def get(self, url, headers=None, transfer=None):
+        """sends a GET request for the url; yields the response if successful (200, or 206 for a range request), raises
+        urllib.error.HTTPError otherwise
+
+        a request on a reused connection that the dashcam closed in the meantime is sent again on another connection;
+        the connection is reused if the response is read in full; retries and connection reuse are counted in the
+        transfer telemetry record, if given"""
+        split_url = urllib.parse.urlsplit(url)
+        url_path = split_url.path + ("?%s" % split_url.query if split_url.query else "")
+
+        while True:
+            connection, reused = self.acquire()
+            try:
+                connection.request("GET", url_path, headers=headers or {})
+                response = connection.getresponse()
+                break
+            except socket.timeout:
+                connection.close()
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+
+                if reused and isinstance(e, (ConnectionError, http.client.BadStatusLine)):
+                    logger.debug("Dashcam closed an idle connection; retrying : %s; error : %s", url, e)
+                    if transfer is not None:
+                        transfer["retries"] += 1
+                    continue
+
+                if isinstance(e, http.client.HTTPException):
+                    raise
+
+                # as urllib.request.urlopen, e.g. connection refused
+                raise urllib.error.URLError(e)
+            except BaseException:
+                connection.close()
+                raise
+
+        if transfer is not None:
+            transfer["reused_connection"] = reused
+
+        try:
+            if response.status not in (200, 206):
+                # reads the error page so that the connection can be reused
+                response.read()
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+
+            yield response
+        finally:
+            if response.isclosed():
+                self.release(connection)
+            else:
+                connection.close()
+
+    def close(self):
+        """closes the idle connections"""
+        with self.lock:
+            for connection in self.idle_connections:
+                connection.close()
+            self.idle_connections = []
+
+
+# connection pools, keyed by dashcam address
+connection_pools = {}
+connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(url):
+    """returns the connection pool for the address of the url"""
+    host = urllib.parse.urlsplit(url).netloc
+
+    with connection_pools_lock:
+        connection_pool = connection_pools.get(host)
+        if connection_pool is None:
+            connection_pool = connection_pools[host] = ConnectionPool(host)
+
+    return connection_pool
+
+
+def close_connection_pools():
+    """closes the idle connections of all connection pools"""
+    with connection_pools_lock:
+        for connection_pool in connection_pools.values():
+            connection_pool.close()
+        connection_pools.clear()
+
+
 def get_dashcam_filenames(base_url):
     """gets the recording filenames from the dashcam"""
     try:
         url = urllib.parse.urljoin(base_url, "blackvue_vod.cgi")
-        request = urllib.request.Request(url)
-        response = urllib.request.urlopen(request)
-
-        response_status_code = response.getcode()
-        if response_status_code != 200:
-            raise RuntimeError("Error response from : %s ; status code : %s" % (base_url, response_status_code))
 
-        charset = response.info().get_param("charset", "UTF-8")
-        file_lines = [x.decode(charset) for x in response.readlines()]
+        with get_connection_pool(url).get(url) as response:
+            charset = response.info().get_param("charset", "UTF-8")
+            # reads the whole body, as readlines() would leave the response open and the connection not reusable
+            file_lines = [x.decode(charset) for x in response.read().splitlines(keepends=True)]
 
         return get_filenames(file_lines)
     except urllib.error.URLError as e:
@@ -213,6 +339,113 @@ def to_natural_speed(speed_bps):
     return 0, "bps"
 
 
+class TokenBucket:
+    """caps a rate shared by threads: consumers take tokens, and wait for them once the bucket, which holds a second's
+    worth, runs dry"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = int(rate)
+        self.tokens = rate
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        """takes amount tokens, waiting as long as it takes for the bucket to refill"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate) - amount
+            self.timestamp = now
+
+            # the tokens taken in advance are owed by whoever comes next as well
+            wait_s = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait_s:
+            time.sleep(wait_s)
+
+
+class Telemetry:
+    """transfer statistics of a sync: a record per file and a summary, optionally appended as JSON lines to a file,
+    and the recent throughput for scheduling"""
+
+    def __init__(self, filepath=None, low_bandwidth_bps=None, recent_transfers=10):
+        self.file = open(filepath, "a", encoding="utf-8") if filepath else None
+        self.low_bandwidth_bps = low_bandwidth_bps
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+
+        self.files = 0
+        self.failed_files = 0
+        self.bytes = 0
+        self.retries = 0
+        self.reused_connections = 0
+
+        # (start, end, bytes) of the most recent transfers
+        self.recent_transfers = deque(maxlen=recent_transfers)
+
+    def write(self, record):
+        if self.file:
+            self.file.write("%s\n" % json.dumps(record, sort_keys=True))
+            self.file.flush()
+
+    def record(self, transfer):
+        """records the telemetry of a file transfer, as made by download_file"""
+        with self.lock:
+            self.files += 1
+            self.failed_files += 1 if transfer["error"] else 0
+            self.bytes += transfer["bytes"]
+            self.retries += transfer["retries"]
+            self.reused_connections += 1 if transfer["reused_connection"] else 0
+
+            if transfer["seconds"] is not None:
+                end = time.perf_counter()
+                self.recent_transfers.append((end - transfer["seconds"], end, transfer["bytes"]))
+
+            self.write(dict(transfer, event="file", time=datetime.datetime.now().replace(microsecond=0).isoformat()))
+
+    def get_recent_bps(self):
+        """returns the throughput of the recent transfers over the time they took together, so across threads"""
+        with self.lock:
+            if not self.recent_transfers:
+                return None
+            elapsed_s = max(t[1] for t in self.recent_transfers) - min(t[0] for t in self.recent_transfers)
+            recent_bytes = sum(t[2] for t in self.recent_transfers)
+
+        return int(8. * recent_bytes / elapsed_s) if elapsed_s > 0 else None
+
+    def is_low_bandwidth(self):
+        """tests if the recent throughput is below the low bandwidth threshold, if any"""
+        if self.low_bandwidth_bps is None:
+            return False
+
+        recent_bps = self.get_recent_bps()
+        return recent_bps is not None and recent_bps < self.low_bandwidth_bps
+
+    def get_summary(self):
+        with self.lock:
+            elapsed_s = time.perf_counter() - self.start
+            return {"files": self.files, "failed_files": self.failed_files, "bytes": self.bytes,
+                    "seconds": round(elapsed_s, 3), "bps": int(8. * self.bytes / elapsed_s) if elapsed_s else None,
+                    "retries": self.retries, "reused_connections": self.reused_connections}
+
+    def log_summary(self):
+        """logs the summary of the transfers, and appends it to the telemetry file"""
+        summary = self.get_summary()
+
+        if summary["files"]:
+            logger.info("Transferred %s files (%s failed), %s bytes in %.1fs%s; %s retries, %s reused connections",
+                        summary["files"], summary["failed_files"], summary["bytes"], summary["seconds"],
+                        " (%s%s)" % to_natural_speed(summary["bps"]) if summary["bps"] else "",
+                        summary["retries"], summary["reused_connections"])
+
+        self.write(dict(summary, event="summary", time=datetime.datetime.now().replace(microsecond=0).isoformat()))
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
 def get_filepath(destination, group_name, filename):
     """constructs a path for a recording file from the destination, group name and filename"""
     if group_name:
@@ -221,6 +454,89 @@ def get_filepath(destination, group_name, filename):
         return os.path.join(destination, filename)
 
 
+# size of the chunks in which files are read from the dashcam and written to disk
+download_chunk_size = 1024 * 1024
+
+
+# content range of a partial response
+content_range_re = re.compile(r"bytes (?P<first>\d+)-(?P<last>\d+)/(?P<length>\d+|\*)")
+
+
+def retrieve(url, filepath, transfer=None):
+    """downloads the file at the url to the given path over a pooled connection, streaming it in large chunks; returns
+    the number of bytes transferred, also counted as they arrive in the transfer telemetry record, if given
+
+    the download of an existing partial file is resumed with a range request; if the dashcam ignores the range, the
+    file is downloaded again from the start"""
+    offset = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+
+    # with a bandwidth cap, reads no more than the bucket holds at once so the cap is smooth
+    chunk_size = download_chunk_size if bandwidth_limiter is None \
+        else max(1, min(download_chunk_size, bandwidth_limiter.capacity))
+
+    while True:
+        headers = {"Range": "bytes=%s-" % offset} if offset else None
+
+        try:
+            with get_connection_pool(url).get(url, headers, transfer) as response:
+                content_length = response.getheader("Content-Length")
+                content_length = int(content_length) if content_length is not None else None
+                content_range_match = None
+
+                if response.status == 206:
+                    content_range = response.getheader("Content-Range", "")
+                    content_range_match = re.fullmatch(content_range_re, content_range)
+                    if content_range_match is None or int(content_range_match.group("first")) != offset:
+                        # leaves the response unread, so its connection is not reused
+                        logger.debug("Cannot resume download : %s; content range : %s", url, content_range)
+                        offset = 0
+                        if transfer is not None:
+                            transfer["retries"] += 1
+                        continue
+                    logger.debug("Resuming download at byte %s : %s", offset, url)
+                elif offset:
+                    logger.debug("Dashcam ignored range, downloading from the start : %s", url)
+                    offset = 0
+
+                if transfer is not None:
+                    transfer["resumed_from"] = offset
+
+                size = 0
+                with open(filepath, "ab" if offset else "wb") as f:
+                    while True:
+                        chunk = response.read(chunk_size)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        size += len(chunk)
+
+                        if transfer is not None:
+                            transfer["bytes"] += len(chunk)
+                        if bandwidth_limiter is not None:
+                            bandwidth_limiter.consume(len(chunk))
+                break
+        except urllib.error.HTTPError as e:
+            # range not satisfiable, e.g. the partial file is not smaller than the file
+            if e.code != 416 or not offset:
+                raise
+            logger.debug("Cannot resume download : %s; error : %s", url, e)
+            offset = 0
+            if transfer is not None:
+                transfer["retries"] += 1
+
+    # as urllib.request.urlretrieve; the bytes transferred are kept to resume from
+    if content_length is not None and size < content_length:
+        raise urllib.error.ContentTooShortError("retrieval incomplete: got only %i out of %i bytes"
+                                                % (size, content_length), None)
+
+    if content_range_match and content_range_match.group("length") != "*" \
+            and offset + size != int(content_range_match.group("length")):
+        raise urllib.error.ContentTooShortError("retrieval incomplete: got only %i out of %s bytes"
+                                                % (offset + size, content_range_match.group("length")), None)
+
+    return size
+
+
 def download_file(base_url, filename, destination, group_name):
     """downloads a file from the dashcam to the destination directory; returns whether data was transferred"""
     global dry_run
@@ -232,50 +548,63 @@ def download_file(base_url, filename, destination, group_name):
 
     filepath = get_filepath(destination, group_name, filename)
 
-    if os.path.exists(filepath):
+    if is_downloaded(destination, group_name, filename):
         logger.debug("Ignoring already downloaded file : %s", filename)
         return False, None
 
     temp_filepath = os.path.join(destination, ".%s" % filename)
     if os.path.exists(temp_filepath):
-        logger.debug("Found incomplete download : %s", temp_filepath)
+        logger.debug("Found incomplete download, resuming : %s", temp_filepath)
 
     if not dry_run:
+        # telemetry record of the transfer
+        transfer = {"file": filename, "bytes": 0, "seconds": None, "bps": None, "retries": 0,
+                    "reused_connection": False, "resumed_from": 0, "error": None}
         try:
             url = urllib.parse.urljoin(base_url, "Record/%s" % filename)
 
             start = time.perf_counter()
             try:
-                _, headers = urllib.request.urlretrieve(url, temp_filepath)
-                size = headers["Content-Length"]
+                size = retrieve(url, temp_filepath, transfer)
             finally:
                 end = time.perf_counter()
                 elapsed_s = end - start
+                transfer["seconds"] = round(elapsed_s, 3)
+                transfer["bps"] = int(8. * transfer["bytes"] / elapsed_s) if elapsed_s else None
 
             os.rename(temp_filepath, filepath)
+            if destination_index is not None:
+                destination_index.add(group_name, filename)
 
-            speed_bps = int(10. * float(size) / elapsed_s) if size else None
+            speed_bps = int(8. * float(size) / elapsed_s) if size and elapsed_s else None
             logger.debug("Downloaded file : %s%s", filename,
                          " (%s%s)" % to_natural_speed(speed_bps) if speed_bps else "")
 
             return True, speed_bps
-        except urllib.error.URLError as e:
+        except socket.timeout as e:
+            transfer["error"] = "timeout"
+            raise UserWarning("Timeout communicating with dashcam at address : %s; error : %s" % (base_url, e))
+        except (urllib.error.URLError, http.client.HTTPException, ConnectionError) as e:
+            transfer["error"] = str(e)
             # data corruption may lead to error status codes; logs a warning (cron) and returns normally
             cron_logger.warning("Could not download file : %s; error : %s; ignoring.", filename, e)
             return False, None
-        except socket.timeout as e:
-            raise UserWarning("Timeout communicating with dashcam at address : %s; error : %s" % (base_url, e))
+        except BaseException as e:
+            # anything else aborts the run; still recorded as a failed transfer
+            transfer["error"] = repr(e)
+            raise
+        finally:
+            if telemetry is not None:
+                telemetry.record(transfer)
     else:
         logger.debug("DRY RUN Would download file : %s", filename)
         return True, None
 
 
-def download_recording(base_url, recording, destination):
-    """downloads the set of recordings, including gps data, for the given filename from the dashcam to the destination
-    directory"""
+def check_disk_usage(destination):
+    """raises an error if the disk of the destination directory is used over the max disk usage percent"""
     global max_disk_used_percent
 
-    # first checks that we have enough room left
     disk_usage = shutil.disk_usage(destination)
     disk_used_percent = disk_usage.used / disk_usage.total * 100.0
 
@@ -283,32 +612,32 @@ def download_recording(base_url, recording, destination):
         raise RuntimeError("Not enough disk space left. Max used disk space percentage allowed : %s%%"
                            % max_disk_used_percent)
 
-    # whether any file of a recording (video, thumbnail, gps, accel.) was downloaded
-    any_downloaded = False
 
-    # downloads the video recording
-    filename = recording.filename
-    downloaded, speed_bps = download_file(base_url, filename, destination, recording.group_name)
-    any_downloaded |= downloaded
+def get_recording_filenames(recording):
+    """returns the filenames of the files of a recording in download order: video, thumbnail, accelerometer data and,
+    for normal, event and manual recordings, gps data"""
+    filenames = [
+        recording.filename,
+        "%s_%s%s.thm" % (recording.base_filename, recording.type, recording.direction),
+        "%s_%s.3gf" % (recording.base_filename, recording.type),
+    ]
 
-    # downloads the thumbnail file
-    thm_filename = "%s_%s%s.thm" % (recording.base_filename, recording.type, recording.direction)
-    downloaded, _ = download_file(base_url, thm_filename, destination, recording.group_name)
-    any_downloaded |= downloaded
+    if recording.type in ("N", "E", "M"):
+        filenames.append("%s_%s.gps" % (recording.base_filename, recording.type))
+
+    return filenames
 
-    # downloads the accelerometer data
-    tgf_filename = "%s_%s.3gf" % (recording.base_filename, recording.type)
-    downloaded, _ = download_file(base_url, tgf_filename, destination, recording.group_name)
-    any_downloaded |= downloaded
 
-    # downloads the gps data for normal, event and manual recordings
-    if recording.type in ("N", "E", "M"):
-        gps_filename = "%s_%s.gps" % (recording.base_filename, recording.type)
-        downloaded, _ = download_file(base_url, gps_filename, destination, recording.group_name)
-        any_downloaded |= downloaded
+def log_recording(recording, results):
+    """logs if any part of a recording was downloaded (or would have been), given the download_file results of its
+    files"""
+    # whether any file of a recording (video, thumbnail, gps, accel.) was downloaded
+    any_downloaded = any(downloaded for downloaded, _ in results)
 
-    # logs if any part of a recording was downloaded (or would have been)
     if any_downloaded:
+        # the speed is the one of the video recording
+        _, speed_bps = results[0]
+
         # recording logger, depends on type of recording
         recording_logger = cron_logger if recording.type in ("N", "M") else logger
 
@@ -319,6 +648,100 @@ def download_recording(base_url, recording, destination):
             recording_logger.info("DRY RUN Would download recording : %s", recording.base_filename)
 
 
+def download_recording(base_url, recording, destination):
+    """downloads the set of recordings, including gps data, for the given filename from the dashcam to the destination
+    directory"""
+    # first checks that we have enough room left
+    check_disk_usage(destination)
+
+    results = [download_file(base_url, filename, destination, recording.group_name)
+               for filename in get_recording_filenames(recording)]
+
+    log_recording(recording, results)
+
+
+def wait_for_downloads(running, max_running):
+    """waits until at most max_running of the running file downloads are left, which are returned; raises the error of
+    a failed download"""
+    while len(running) > max_running:
+        done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            future.result()
+
+    return running
+
+
+def log_downloaded_recordings(scheduled):
+    """logs the recordings at the front of the scheduled queue whose files are all downloaded, so in priority order"""
+    while scheduled and all(future.done() for future in scheduled[0][1]):
+        recording, futures = scheduled.popleft()
+        log_recording(recording, [future.result() for future in futures])
+
+
+def pop_next_recording(recordings):
+    """pops the next recording to download from a deque of recordings: the first one or, while the measured throughput
+    is low, the first manual or event recording, which are the ones to have if the link gets worse"""
+    if telemetry is not None and telemetry.is_low_bandwidth():
+        for i, recording in enumerate(recordings):
+            if recording.type in ("M", "E"):
+                del recordings[i]
+                return recording
+
+    return recordings.popleft()
+
+
+def download_recordings(base_url, recordings, destination):
+    """downloads the recordings in the given order, but for manual and event recordings first while the bandwidth is
+    low; with a concurrency greater than one, their files are downloaded by a pool of threads, which starts them in
+    that same order"""
+    global concurrency
+
+    # recordings left to download
+    pending_recordings = deque(recordings)
+
+    if not concurrency or concurrency <= 1:
+        while pending_recordings:
+            download_recording(base_url, pop_next_recording(pending_recordings), destination)
+        return
+
+    # leaving the block waits for the downloads in progress, so none outlives the lock or runs into clean_destination
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # recordings with the futures of their files, in priority order
+        scheduled = deque()
+
+        # file downloads scheduled and not known to be finished
+        running = set()
+
+        # front and rear recordings share accelerometer and gps files, which must not be downloaded twice at once
+        scheduled_filenames = set()
+
+        while pending_recordings:
+            recording = pop_next_recording(pending_recordings)
+
+            # as in a sequential download, checks that we have enough room left before starting on a recording
+            check_disk_usage(destination)
+
+            futures = []
+            for filename in get_recording_filenames(recording):
+                if filename in scheduled_filenames:
+                    continue
+                scheduled_filenames.add(filename)
+
+                # schedules no more files than there are threads, so that the disk usage check is current and an
+                # error stops the download soon
+                running = wait_for_downloads(running, concurrency - 1)
+
+                future = executor.submit(download_file, base_url, filename, destination, recording.group_name)
+                futures.append(future)
+                running.add(future)
+
+            scheduled.append((recording, futures))
+            log_downloaded_recordings(scheduled)
+
+        wait_for_downloads(running, 0)
+        log_downloaded_recordings(scheduled)
+
+
 def sort_recordings(recordings, recording_priority):
     """sorts recordings in place according to the given priority"""
 
@@ -356,8 +779,140 @@ group_name_globs = {
 filename_glob = "[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]_[0-9][0-9][0-9][0-9][0-9][0-9]_[NEPM][FR].mp4"
 
 
+# dashcam recording file (video, thumbnail, accelerometer or gps data) filename regular expression
+recording_filename_re = re.compile(r"""\d{8}_\d{6}_[NEPM][FR]?\.(mp4|thm|3gf|gps)""")
+
+
+class DestinationIndex:
+    """the recording files downloaded to a destination, as paths relative to it, so that a sync neither globs the
+    destination nor tests each file for existence
+
+    the index file is a journal of "+path" and "-path" lines appended as files are downloaded and removed; it is
+    rewritten with only the current paths once they make up less than half of it, and built from the destination if
+    missing or on request"""
+
+    def __init__(self, destination, grouping):
+        self.destination = destination
+        self.grouping = grouping
+        self.filepath = os.path.join(destination, ".blackvuesync.index")
+        self.paths = set()
+        self.journal_file = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_path(group_name, filename):
+        """the path of a file relative to the destination"""
+        return os.path.join(group_name, filename) if group_name else filename
+
+    def load(self, rebuild=False):
+        """loads the index file, or builds it from the destination if missing or if rebuild is set"""
+        global dry_run
+
+        if rebuild or not os.path.exists(self.filepath):
+            logger.info("Indexing destination : %s", self.destination)
+            self.paths = self.scan()
+            journal_lines = None
+        else:
+            self.paths = set()
+            journal_lines = 0
+            with open(self.filepath, "r", encoding="utf-8") as f:
+                for line in f:
+                    journal_lines += 1
+                    if line.startswith("+"):
+                        self.paths.add(line[1:].rstrip("\n"))
+                    elif line.startswith("-"):
+                        self.paths.discard(line[1:].rstrip("\n"))
+
+        if dry_run:
+            return
+
+        if journal_lines is None or journal_lines > 2 * len(self.paths):
+            self.compact()
+
+        self.journal_file = open(self.filepath, "a", encoding="utf-8")
+
+    def scan(self):
+        """returns the paths of the recording files in the destination and its grouping directories"""
+        group_name_glob = group_name_globs[self.grouping]
+        group_names = [""]
+        if group_name_glob:
+            group_names += [os.path.basename(p) for p in glob.glob(os.path.join(self.destination, group_name_glob))
+                            if os.path.isdir(p)]
+
+        paths = set()
+        for group_name in group_names:
+            for entry in os.scandir(os.path.join(self.destination, group_name)):
+                if re.fullmatch(recording_filename_re, entry.name) and entry.is_file():
+                    paths.add(self.get_path(group_name, entry.name))
+
+        return paths
+
+    def compact(self):
+        """rewrites the index file with the current paths only"""
+        temp_filepath = "%s.tmp" % self.filepath
+        with open(temp_filepath, "w", encoding="utf-8") as f:
+            f.writelines("+%s\n" % path for path in sorted(self.paths))
+        os.replace(temp_filepath, self.filepath)
+
+    def write(self, line):
+        """appends a line to the index file, unless in a dry run"""
+        if self.journal_file:
+            self.journal_file.write(line)
+            self.journal_file.flush()
+
+    def contains(self, group_name, filename):
+        return self.get_path(group_name, filename) in self.paths
+
+    def add(self, group_name, filename):
+        path = self.get_path(group_name, filename)
+        with self.lock:
+            if path not in self.paths:
+                self.paths.add(path)
+                self.write("+%s\n" % path)
+
+    def remove(self, group_name, filename):
+        path = self.get_path(group_name, filename)
+        with self.lock:
+            if path in self.paths:
+                self.paths.discard(path)
+                self.write("-%s\n" % path)
+
+    def get_group_names(self):
+        """returns the names of the grouping directories with video recordings"""
+        with self.lock:
+            return set(os.path.dirname(p) for p in self.paths if p.endswith(".mp4"))
+
+    def get_recordings(self):
+        """returns the video recordings where the grouping puts them, as get_destination_recordings"""
+        with self.lock:
+            paths = [p for p in self.paths if p.endswith(".mp4")]
+
+        recordings = [to_recording(os.path.basename(p), self.grouping) for p in paths]
+        return [r for r, p in zip(recordings, paths) if r is not None and p == self.get_path(r.group_name, r.filename)]
+
+    def close(self):
+        if self.journal_file:
+            self.journal_file.close()
+            self.journal_file = None
+
+
+def is_downloaded(destination, group_name, filename):
+    """tests if a file was downloaded to the destination, from the destination index if there is one"""
+    global destination_index
+
+    if destination_index is not None:
+        return destination_index.contains(group_name, filename)
+
+    return os.path.exists(get_filepath(destination, group_name, filename))
+
+
 def get_destination_recordings(destination, grouping):
     """reads files from the destination directory and returns them as recording records"""
+    global destination_index
+
+    if destination_index is not None:
+        return destination_index.get_recordings()
+
     group_name_glob = group_name_globs[grouping]
 
     existing_filepath_glob = get_filepath(destination, group_name_glob, filename_glob)
@@ -384,7 +939,8 @@ def ensure_destination(destination):
     """ensures the destination directory exists, creates if not, verifies it's writeable"""
     # if no destination, creates it
     if not os.path.exists(destination):
-        os.makedirs(destination)
+        # concurrent downloads may create the same group directory at the same time
+        os.makedirs(destination, exist_ok=True)
         return
 
     # destination exists, tests if directory
@@ -407,53 +963,52 @@ def prepare_destination(destination, grouping):
         outdated_recordings = get_outdated_recordings(existing_recordings)
 
         for outdated_recording in outdated_recordings:
-            outdated_filepath = get_filepath(destination, outdated_recording.group_name, outdated_recording.filename)
             if not dry_run:
                 logger.info("Removing outdated recording : %s", outdated_recording.base_filename)
 
-                # removes the video recording
-                os.remove(outdated_filepath)
-
-                # removes the thumbnail file
-                outdated_thm_filename = "%s_%s%s.thm" % (outdated_recording.base_filename, outdated_recording.type,
-                                                         outdated_recording.direction)
-                outdated_thm_filepath = get_filepath(destination, outdated_recording.group_name, outdated_thm_filename)
-                if os.path.exists(outdated_thm_filepath):
-                    os.remove(outdated_thm_filepath)
-
-                # removes the accelerometer data
-                outdated_tgf_filename = "%s_%s.3gf" % (outdated_recording.base_filename, outdated_recording.type)
-                outdated_tgf_filepath = get_filepath(destination, outdated_recording.group_name, outdated_tgf_filename)
-                if os.path.exists(outdated_tgf_filepath):
-                    os.remove(outdated_tgf_filepath)
-
-                # removes the gps data for normal, event and manual recordings
-                if outdated_recording.type in ("N", "E", "M"):
-                    outdated_gps_filename = "%s_%s.gps" % (outdated_recording.base_filename, outdated_recording.type)
-                    outdated_gps_filepath = get_filepath(destination, outdated_recording.group_name,
-                                                         outdated_gps_filename)
-                    if os.path.exists(outdated_gps_filepath):
-                        os.remove(outdated_gps_filepath)
+                # removes the video recording, the thumbnail file, the accelerometer data and the gps data
+                for outdated_filename in get_recording_filenames(outdated_recording):
+                    outdated_filepath = get_filepath(destination, outdated_recording.group_name, outdated_filename)
+                    if os.path.exists(outdated_filepath):
+                        os.remove(outdated_filepath)
+
+                    if destination_index is not None:
+                        destination_index.remove(outdated_recording.group_name, outdated_filename)
             else:
                 logger.info("DRY RUN Would remove outdated recording : %s", outdated_recording.base_filename)
 
 
 def sync(address, destination, grouping, download_priority):
     """synchronizes the recordings at the dashcam address with the destination directory"""
+    global current_dashcam_filenames
+
     prepare_destination(destination, grouping)
 
     base_url = "http://%s" % address
-    dashcam_filenames = get_dashcam_filenames(base_url)
-    dashcam_recordings = [to_recording(x, grouping) for x in dashcam_filenames]
+    try:
+        dashcam_filenames = get_dashcam_filenames(base_url)
+        dashcam_recordings = [to_recording(x, grouping) for x in dashcam_filenames]
 
-    # figures out which recordings are current and should be downloaded
-    current_dashcam_recordings = get_current_recordings(dashcam_recordings)
+        # figures out which recordings are current and should be downloaded
+        current_dashcam_recordings = get_current_recordings(dashcam_recordings)
+        current_dashcam_filenames = set(filename for recording in current_dashcam_recordings
+                                        for filename in get_recording_filenames(recording))
 
-    # sorts the dashcam recordings so we download them according to some priority
-    sort_recordings(current_dashcam_recordings, download_priority)
+        # with an index, leaves out the recordings already downloaded in full as a set operation
+        if destination_index is not None:
+            current_dashcam_recordings = [r for r in current_dashcam_recordings
+                                          if not all(destination_index.contains(r.group_name, f)
+                                                     for f in get_recording_filenames(r))]
 
-    for recording in current_dashcam_recordings:
-        download_recording(base_url, recording, destination)
+        # sorts the dashcam recordings so we download them according to some priority
+        sort_recordings(current_dashcam_recordings, download_priority)
+
+        download_recordings(base_url, current_dashcam_recordings, destination)
+    finally:
+        close_connection_pools()
+
+        if telemetry is not None:
+            telemetry.log_summary()
 
 
 def is_empty_directory(dirpath):
@@ -468,12 +1023,20 @@ temp_filename_glob = ".[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]_[0-9][0-9][0-9][
 def clean_destination(destination, grouping):
     """removes temporary artifacts from the destination directory"""
     global dry_run
+    global current_dashcam_filenames
+    global destination_index
 
-    # removes temporary files from interrupted downloads
+    # removes temporary files from interrupted downloads of recordings no longer on the dashcam
     temp_filepath_glob = os.path.join(destination, temp_filename_glob)
     temp_filepaths = glob.glob(temp_filepath_glob)
 
     for temp_filepath in temp_filepaths:
+        # keeps all of them if the dashcam could not be listed
+        temp_filename = os.path.basename(temp_filepath)[1:]
+        if current_dashcam_filenames is None or temp_filename in current_dashcam_filenames:
+            logger.debug("Keeping incomplete download : %s", temp_filepath)
+            continue
+
         if not dry_run:
             logger.debug("Removing temporary file : %s" % temp_filepath)
             os.remove(temp_filepath)
@@ -487,7 +1050,13 @@ def clean_destination(destination, grouping):
 
         group_filepaths = glob.glob(group_filepath_glob)
 
+        # grouping directories with indexed video recordings are not empty, and need not be listed
+        indexed_group_names = destination_index.get_group_names() if destination_index is not None else set()
+
         for group_filepath in group_filepaths:
+            if os.path.basename(group_filepath) in indexed_group_names:
+                continue
+
             if is_empty_directory(group_filepath):
                 if not dry_run:
                     logger.debug("Removing grouping directory : %s" % group_filepath)
@@ -556,6 +1125,21 @@ def parse_args():
     arg_parser.add_argument("-t", "--timeout", metavar="TIMEOUT", default=10.0,
                             type=float,
                             help="sets the connection timeout in seconds (float); defaults to 10.0 seconds")
+    arg_parser.add_argument("-c", "--concurrency", metavar="CONCURRENCY", default=1,
+                            type=int,
+                            help="downloads up to CONCURRENCY files at the same time, still starting them in priority "
+                                 "order; defaults to 1")
+    arg_parser.add_argument("--max-bandwidth", metavar="MBPS", type=float,
+                            help="caps the download bandwidth to MBPS megabits per second (float)")
+    arg_parser.add_argument("--low-bandwidth", metavar="MBPS", type=float,
+                            help="downloads manual and event recordings first while the measured download throughput "
+                                 "is below MBPS megabits per second (float)")
+    arg_parser.add_argument("--telemetry", metavar="TELEMETRY_FILE",
+                            help="appends the statistics of each file transfer and of the sync to TELEMETRY_FILE, as "
+                                 "JSON lines")
+    arg_parser.add_argument("--reindex", action="store_true",
+                            help="rebuilds the index of downloaded recordings from the destination directory, e.g. "
+                                 "after recordings were removed or moved by hand")
     arg_parser.add_argument("-v", "--verbose", action="count", default=0,
                             help="increases verbosity")
     arg_parser.add_argument("-q", "--quiet", action="store_true",
@@ -577,6 +1161,10 @@ def run():
     global max_disk_used_percent
     global cutoff_date
     global socket_timeout
+    global concurrency
+    global destination_index
+    global telemetry
+    global bandwidth_limiter
 
     args = parse_args()
 
@@ -594,6 +1182,20 @@ def run():
         raise argparse.ArgumentTypeError("TIMEOUT must be greater than zero.")
     socket.setdefaulttimeout(socket_timeout)
 
+    # sets the number of concurrent downloads
+    concurrency = args.concurrency
+    if concurrency < 1:
+        raise argparse.ArgumentTypeError("CONCURRENCY must be greater than zero.")
+
+    # sets the bandwidth cap, in bytes per second
+    if args.max_bandwidth is not None:
+        if args.max_bandwidth <= 0:
+            raise argparse.ArgumentTypeError("MAX_BANDWIDTH must be greater than zero.")
+        bandwidth_limiter = TokenBucket(args.max_bandwidth * 1000000 / 8)
+
+    if args.low_bandwidth is not None and args.low_bandwidth <= 0:
+        raise argparse.ArgumentTypeError("LOW_BANDWIDTH must be greater than zero.")
+
     # lock file file descriptor
     lf_fd = None
 
@@ -611,11 +1213,20 @@ def run():
 
         lf_fd = lock(destination)
 
+        # transfer telemetry, also measuring the throughput for scheduling
+        telemetry = Telemetry(args.telemetry, args.low_bandwidth * 1000000 if args.low_bandwidth else None)
+
+        # index of the downloaded recordings, read under the lock
+        destination_index = DestinationIndex(destination, grouping)
+        destination_index.load(args.reindex)
+
         try:
             sync(args.address, destination, grouping, args.priority)
         finally:
-            # removes temporary files (if we synced successfully, these are temp files from lost recordings)
+            # removes temporary files from lost recordings; the others are resumed by the next sync
             clean_destination(destination, grouping)
+            destination_index.close()
+            telemetry.close()
     except UserWarning as e:
         logger.warning(e.args[0])
         return 1
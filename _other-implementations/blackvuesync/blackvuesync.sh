@@ -15,6 +15,15 @@ disk_usage=${MAX_USED_DISK:+--max-used-disk $MAX_USED_DISK}
 # timeout set if TIMEOUT set
 timeout=${TIMEOUT:+--timeout $TIMEOUT}
 
+# concurrency set if CONCURRENCY set
+concurrency=${CONCURRENCY:+--concurrency $CONCURRENCY}
+
+# bandwidth cap set if MAX_BANDWIDTH set
+max_bandwidth=${MAX_BANDWIDTH:+--max-bandwidth $MAX_BANDWIDTH}
+
+# low bandwidth threshold set if LOW_BANDWIDTH set
+low_bandwidth=${LOW_BANDWIDTH:+--low-bandwidth $LOW_BANDWIDTH}
+
 # as many verbose options as the value in VERBOSE
 verbose=${VERBOSE:+$(if [[ $VERBOSE -gt 0 ]]; then for i in $(seq 1 $VERBOSE); do echo --verbose; done; fi)}
 
@@ -28,5 +37,5 @@ cron="${CRON:+--cron}"
 dry_run="${DRY_RUN:+--dry-run}"
 
 
-/blackvuesync.py ${ADDRESS} --destination /recordings ${keep} ${grouping} ${priority} ${disk_usage} ${timeout} ${verbose} \
-    ${quiet} ${cron} ${dry_run}
+/blackvuesync.py ${ADDRESS} --destination /recordings ${keep} ${grouping} ${priority} ${disk_usage} ${timeout} ${concurrency} \
+    ${max_bandwidth} ${low_bandwidth} ${verbose} ${quiet} ${cron} ${dry_run}
@@ -2,6 +2,14 @@
 
 import pytest
 import datetime
+import functools
+import http.server
+import io
+import json
+import os
+import re
+import threading
+import time
 
 import blackvuesync
 
@@ -89,3 +97,348 @@ def test_sort_recordings(priority, filenames, expected_sorted_filenames):
     blackvuesync.sort_recordings(sorted_recordings, priority)
 
     assert expected_sorted_recordings == sorted_recordings
+
+
+@pytest.mark.parametrize("filename, expected_filenames", [
+    ("20190219_104220_NF.mp4",
+     ["20190219_104220_NF.mp4", "20190219_104220_NF.thm", "20190219_104220_N.3gf", "20190219_104220_N.gps"]),
+    ("20190219_224918_PR.mp4", ["20190219_224918_PR.mp4", "20190219_224918_PR.thm", "20190219_224918_P.3gf"]),
+])
+def test_get_recording_filenames(filename, expected_filenames):
+    recording = blackvuesync.to_recording(filename, "none")
+
+    assert expected_filenames == blackvuesync.get_recording_filenames(recording)
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_download_recordings(concurrency, monkeypatch, tmp_path):
+    filenames = ["20190219_104220_NF.mp4", "20190219_104220_NR.mp4", "20190219_224918_PF.mp4",
+                 "20190224_172246_EF.mp4", "20190224_172246_ER.mp4"]
+    recordings = [blackvuesync.to_recording(f, "none") for f in filenames]
+    # front and rear recordings share their accelerometer and gps files
+    expected_filenames = list(dict.fromkeys(f for r in recordings for f in blackvuesync.get_recording_filenames(r)))
+
+    started_filenames = []
+    running = []
+    max_running = []
+    lock = threading.Lock()
+
+    def download_file(base_url, filename, destination, group_name):
+        with lock:
+            # the same file is never downloaded twice at once
+            assert filename not in running
+
+            # as download_file, ignores already downloaded files
+            if filename in started_filenames:
+                return False, None
+
+            started_filenames.append(filename)
+            running.append(filename)
+            max_running.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(filename)
+        return True, None
+
+    monkeypatch.setattr(blackvuesync, "download_file", download_file)
+    monkeypatch.setattr(blackvuesync, "concurrency", concurrency)
+    monkeypatch.setattr(blackvuesync, "max_disk_used_percent", 100)
+
+    blackvuesync.download_recordings("http://dashcam", recordings, str(tmp_path))
+
+    assert sorted(expected_filenames) == sorted(started_filenames)
+    assert concurrency == max(max_running)
+    # files start in priority order, give or take the ones picked up by other threads at the same time
+    assert all(abs(i - started_filenames.index(f)) < concurrency for i, f in enumerate(expected_filenames))
+
+
+def test_download_recordings_disk_usage(monkeypatch, tmp_path):
+    recordings = [blackvuesync.to_recording("20190219_104220_NF.mp4", "none")]
+
+    monkeypatch.setattr(blackvuesync, "download_file", lambda *args: pytest.fail("downloaded over max disk usage"))
+    monkeypatch.setattr(blackvuesync, "concurrency", 3)
+    monkeypatch.setattr(blackvuesync, "max_disk_used_percent", 0)
+
+    with pytest.raises(RuntimeError):
+        blackvuesync.download_recordings("http://dashcam", recordings, str(tmp_path))
+
+
+class KeepAliveHandler(http.server.SimpleHTTPRequestHandler):
+    """serves files over persistent HTTP/1.1 connections, counting connections"""
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def log_message(self, *args):
+        pass
+
+
+class OneRequestHandler(KeepAliveHandler):
+    """closes connections after one request without saying so, as a dashcam dropping idle connections"""
+    connections = 0
+
+    def handle(self):
+        self.handle_one_request()
+
+
+class RangeHandler(KeepAliveHandler):
+    """also serves open-ended byte ranges, recording the first bytes requested"""
+    connections = 0
+    range_firsts = []
+
+    def send_head(self):
+        range_match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        filepath = self.translate_path(self.path)
+        if range_match is None or not os.path.isfile(filepath):
+            return super().send_head()
+
+        with open(filepath, "rb") as f:
+            data = f.read()
+
+        first = int(range_match.group(1))
+        type(self).range_firsts.append(first)
+        if first >= len(data):
+            self.send_error(416)
+            return None
+
+        self.send_response(206)
+        self.send_header("Content-Range", "bytes %s-%s/%s" % (first, len(data) - 1, len(data)))
+        self.send_header("Content-Length", str(len(data) - first))
+        self.end_headers()
+        return io.BytesIO(data[first:])
+
+
+@pytest.fixture(params=[KeepAliveHandler, OneRequestHandler])
+def dashcam(request, tmp_path):
+    """a dashcam serving one normal recording with its files"""
+    record_path = tmp_path / "dashcam" / "Record"
+    record_path.mkdir(parents=True)
+    for filename in ["20190219_104220_NF.mp4", "20190219_104220_NF.thm", "20190219_104220_N.3gf",
+                     "20190219_104220_N.gps"]:
+        (record_path / filename).write_bytes(filename.encode() * 1000)
+    (tmp_path / "dashcam" / "blackvue_vod.cgi").write_bytes(b"v:1.00\r\nn:/Record/20190219_104220_NF.mp4,s:1000000\r\n")
+
+    handler = request.param
+    handler.connections = 0
+    handler.range_firsts = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0),
+                                             functools.partial(handler, directory=str(tmp_path / "dashcam")))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield handler, "http://127.0.0.1:%s" % server.server_address[1], record_path
+    finally:
+        blackvuesync.close_connection_pools()
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_connection_pool(dashcam, monkeypatch, tmp_path):
+    handler, base_url, record_path = dashcam
+    destination = tmp_path / "destination"
+    destination.mkdir()
+
+    monkeypatch.setattr(blackvuesync, "dry_run", False)
+    monkeypatch.setattr(blackvuesync, "download_chunk_size", 1000)
+    monkeypatch.setattr(blackvuesync, "telemetry", blackvuesync.Telemetry())
+
+    assert ["20190219_104220_NF.mp4"] == blackvuesync.get_dashcam_filenames(base_url)
+
+    recording = blackvuesync.to_recording("20190219_104220_NF.mp4", "none")
+    for filename in blackvuesync.get_recording_filenames(recording):
+        downloaded, _ = blackvuesync.download_file(base_url, filename, str(destination), None)
+
+        assert downloaded
+        assert (record_path / filename).read_bytes() == (destination / filename).read_bytes()
+
+    # missing files are reported as not downloaded, without losing the connection
+    assert (False, None) == blackvuesync.download_file(base_url, "20190219_104220_NR.mp4", str(destination), None)
+    assert not (destination / "20190219_104220_NR.mp4").exists()
+
+    # one connection for all requests, or one per request if the dashcam closes them
+    assert (1 if handler is KeepAliveHandler else 6) == handler.connections
+
+    summary = blackvuesync.telemetry.get_summary()
+    assert 5 == summary["files"]
+    assert 1 == summary["failed_files"]
+    assert sum(len(f) * 1000 for f in blackvuesync.get_recording_filenames(recording)) == summary["bytes"]
+    # a stale connection is retried on the next request
+    if handler is KeepAliveHandler:
+        assert (0, 5) == (summary["retries"], summary["reused_connections"])
+    else:
+        assert (5, 0) == (summary["retries"], summary["reused_connections"])
+
+
+@pytest.mark.parametrize("dashcam, partial_size, expected_range_firsts", [
+    (RangeHandler, 10000, [10000]),
+    (RangeHandler, 22000, [22000]),
+    (RangeHandler, 30000, [30000]),
+    (KeepAliveHandler, 10000, []),
+], indirect=["dashcam"])
+def test_download_file_resume(dashcam, partial_size, expected_range_firsts, monkeypatch, tmp_path):
+    handler, base_url, record_path = dashcam
+    destination = tmp_path / "destination"
+    destination.mkdir()
+
+    monkeypatch.setattr(blackvuesync, "dry_run", False)
+
+    filename = "20190219_104220_NF.mp4"
+    data = (record_path / filename).read_bytes()
+    # the partial file may be larger than the file, e.g. if the dashcam replaced a recording
+    (destination / (".%s" % filename)).write_bytes((data * 2)[:partial_size])
+
+    downloaded, _ = blackvuesync.download_file(base_url, filename, str(destination), None)
+
+    assert downloaded
+    assert data == (destination / filename).read_bytes()
+    assert not (destination / (".%s" % filename)).exists()
+    # a partial file as large as the file is not satisfiable and downloaded again; without range support, the dashcam
+    # sends the whole file
+    assert expected_range_firsts == handler.range_firsts
+
+
+@pytest.mark.parametrize("current_dashcam_filenames, expected_temp_filenames", [
+    (None, [".20190219_104220_NF.mp4", ".20190219_104619_MF.mp4"]),
+    ({"20190219_104220_NF.mp4", "20190219_104220_N.gps"}, [".20190219_104220_NF.mp4"]),
+    (set(), []),
+])
+def test_clean_destination(current_dashcam_filenames, expected_temp_filenames, monkeypatch, tmp_path):
+    for temp_filename in [".20190219_104220_NF.mp4", ".20190219_104619_MF.mp4"]:
+        (tmp_path / temp_filename).write_bytes(b"partial")
+
+    monkeypatch.setattr(blackvuesync, "dry_run", False)
+    monkeypatch.setattr(blackvuesync, "current_dashcam_filenames", current_dashcam_filenames)
+
+    blackvuesync.clean_destination(str(tmp_path), "none")
+
+    assert expected_temp_filenames == sorted(os.listdir(str(tmp_path)))
+
+
+@pytest.mark.parametrize("grouping", ["none", "daily"])
+def test_destination_index(grouping, monkeypatch, tmp_path):
+    monkeypatch.setattr(blackvuesync, "dry_run", False)
+
+    recordings = [blackvuesync.to_recording(f, grouping)
+                  for f in ["20190219_104220_NF.mp4", "20190219_104220_NR.mp4", "20190224_172246_EF.mp4"]]
+    for recording in recordings:
+        for filename in blackvuesync.get_recording_filenames(recording):
+            filepath = blackvuesync.get_filepath(str(tmp_path), recording.group_name, filename)
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            open(filepath, "w").close()
+
+    # without an index file, the index is built from the destination
+    index = blackvuesync.DestinationIndex(str(tmp_path), grouping)
+    index.load()
+
+    assert sorted(blackvuesync.get_destination_recordings(str(tmp_path), grouping)) == sorted(index.get_recordings())
+    assert index.contains(recordings[0].group_name, "20190219_104220_N.gps")
+
+    index.remove(recordings[2].group_name, recordings[2].filename)
+    index.add(recordings[2].group_name, "20190224_172246_ER.mp4")
+    index.close()
+
+    # the journal is replayed
+    index = blackvuesync.DestinationIndex(str(tmp_path), grouping)
+    index.load()
+    index.close()
+
+    assert sorted(recordings[:2] + [blackvuesync.to_recording("20190224_172246_ER.mp4", grouping)]) \
+        == sorted(index.get_recordings())
+    assert not index.contains(recordings[2].group_name, recordings[2].filename)
+
+    # the index file is rewritten once mostly removals
+    index.load()
+    for recording in recordings + index.get_recordings():
+        for filename in blackvuesync.get_recording_filenames(recording):
+            index.remove(recording.group_name, filename)
+    index.close()
+
+    index = blackvuesync.DestinationIndex(str(tmp_path), grouping)
+    index.load()
+    index.close()
+
+    assert set() == index.paths
+    assert 0 == os.path.getsize(str(tmp_path / ".blackvuesync.index"))
+
+
+def test_token_bucket():
+    token_bucket = blackvuesync.TokenBucket(1000000)
+
+    start = time.monotonic()
+    # a second's worth is available at once, then tokens come at the rate
+    token_bucket.consume(1000000)
+    token_bucket.consume(250000)
+    token_bucket.consume(250000)
+    elapsed_s = time.monotonic() - start
+
+    assert 0.45 < elapsed_s < 1.0
+
+
+def test_telemetry(tmp_path):
+    telemetry_filepath = str(tmp_path / "telemetry.jsonl")
+    telemetry = blackvuesync.Telemetry(telemetry_filepath, low_bandwidth_bps=1000000)
+
+    assert not telemetry.is_low_bandwidth()
+
+    telemetry.record({"file": "20190219_104220_NF.mp4", "bytes": 50000, "seconds": 1.0, "bps": 400000, "retries": 1,
+                      "reused_connection": True, "resumed_from": 0, "error": None})
+    telemetry.record({"file": "20190219_104220_NF.thm", "bytes": 0, "seconds": 0.5, "bps": 0, "retries": 0,
+                      "reused_connection": False, "resumed_from": 0, "error": "HTTP Error 404: Not Found"})
+
+    assert telemetry.is_low_bandwidth()
+
+    telemetry.log_summary()
+    telemetry.close()
+
+    with open(telemetry_filepath) as f:
+        records = [json.loads(line) for line in f]
+
+    assert ["file", "file", "summary"] == [r["event"] for r in records]
+    assert "20190219_104220_NF.thm" == records[1]["file"]
+    assert {"files": 2, "failed_files": 1, "bytes": 50000, "retries": 1, "reused_connections": 1} \
+        == {k: records[2][k] for k in ["files", "failed_files", "bytes", "retries", "reused_connections"]}
+
+
+def test_telemetry_unexpected_error(monkeypatch, tmp_path):
+    def retrieve(url, filepath, transfer=None):
+        transfer["bytes"] = 1000
+        raise RuntimeError("disk went away")
+
+    monkeypatch.setattr(blackvuesync, "dry_run", False)
+    monkeypatch.setattr(blackvuesync, "retrieve", retrieve)
+    monkeypatch.setattr(blackvuesync, "telemetry", blackvuesync.Telemetry(str(tmp_path / "telemetry.jsonl")))
+
+    with pytest.raises(RuntimeError):
+        blackvuesync.download_file("http://dashcam/", "20190219_104220_NF.mp4", str(tmp_path), None)
+    blackvuesync.telemetry.close()
+
+    with open(tmp_path / "telemetry.jsonl") as f:
+        records = [json.loads(line) for line in f]
+
+    assert 1 == blackvuesync.telemetry.get_summary()["failed_files"]
+    assert "RuntimeError('disk went away')" == records[0]["error"]
+    assert 1000 == records[0]["bytes"]
+
+
+@pytest.mark.parametrize("is_low_bandwidth, expected_filenames", [
+    (False, ["20190219_104220_NF.mp4", "20190219_104619_PF.mp4", "20190224_172246_EF.mp4", "20190224_172341_MF.mp4"]),
+    (True, ["20190224_172246_EF.mp4", "20190224_172341_MF.mp4", "20190219_104220_NF.mp4", "20190219_104619_PF.mp4"]),
+])
+def test_pop_next_recording(is_low_bandwidth, expected_filenames, monkeypatch):
+    recordings = blackvuesync.deque(blackvuesync.to_recording(f, "none") for f in
+                                    ["20190219_104220_NF.mp4", "20190219_104619_PF.mp4", "20190224_172246_EF.mp4",
+                                     "20190224_172341_MF.mp4"])
+
+    telemetry = blackvuesync.Telemetry()
+    monkeypatch.setattr(telemetry, "is_low_bandwidth", lambda: is_low_bandwidth)
+    monkeypatch.setattr(blackvuesync, "telemetry", telemetry)
+
+    popped_filenames = []
+    while recordings:
+        popped_filenames.append(blackvuesync.pop_next_recording(recordings).filename)
+
+    assert expected_filenames == popped_filenames
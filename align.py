@@ -0,0 +1,109 @@
+#!/bin/python
+
+import array
+import math
+
+import logging
+logger = logging.getLogger(__name__)
+# logger.setLevel(logging.INFO)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NAN = float('nan')
+MAX_GAP = 5000  # ms, positions are not interpolated between fixes further apart (blackvue.TRACK_GAP)
+WINDOW = 1000  # ms around a GPS point whose accelerometer samples belong to it (RMC comes at 1 Hz)
+
+
+def fixes(t):
+    """(timestamp, lat, lng) arrays of the points of track.Track t that have a position"""
+    ts, lat, lng = array.array('q'), array.array('d'), array.array('d')
+    for point in zip(t.timestamp, t.lat, t.lng):
+        if not (math.isnan(point[1]) or math.isnan(point[2])):
+            ts.append(point[0])
+            lat.append(point[1])
+            lng.append(point[2])
+    return ts, lat, lng
+
+
+def interpolate(gps_ts, lat, lng, ts, max_gap=MAX_GAP):
+    """
+    lat, lng arrays at the sorted times ts, linear between the two fixes around each time (gps_ts sorted as well);
+    nan before the first fix, after the last one and between fixes more than max_gap ms apart
+
+    one merge pass over both timelines (numpy.searchsorted when numpy is available), O(len(gps_ts) + len(ts))
+    """
+    if numpy is not None:
+        return _interpolate_numpy(gps_ts, lat, lng, ts, max_gap)
+
+    out_lat = array.array('d', [NAN]) * len(ts)
+    out_lng = array.array('d', [NAN]) * len(ts)
+    n = len(gps_ts)
+    j = 0
+    for i, t in enumerate(ts):
+        while j < n and gps_ts[j] < t:
+            j += 1
+        if j < n and gps_ts[j] == t:
+            out_lat[i], out_lng[i] = lat[j], lng[j]
+        elif 0 < j < n and gps_ts[j] - gps_ts[j - 1] <= max_gap:
+            k = (t - gps_ts[j - 1]) / (gps_ts[j] - gps_ts[j - 1])
+            out_lat[i] = lat[j - 1] + k * (lat[j] - lat[j - 1])
+            out_lng[i] = lng[j - 1] + k * (lng[j] - lng[j - 1])
+    return out_lat, out_lng
+
+
+def _interpolate_numpy(gps_ts, lat, lng, ts, max_gap):
+    gps_ts = numpy.frombuffer(gps_ts, dtype='q')
+    ts = numpy.frombuffer(ts, dtype='q')
+    lat = numpy.frombuffer(lat, dtype='d')
+    lng = numpy.frombuffer(lng, dtype='d')
+    out_lat = numpy.full(len(ts), NAN)
+    out_lng = numpy.full(len(ts), NAN)
+
+    if len(gps_ts) == 1:
+        exact = ts == gps_ts[0]
+        out_lat[exact], out_lng[exact] = lat[0], lng[0]
+    elif len(gps_ts) > 1:
+        right = numpy.clip(numpy.searchsorted(gps_ts, ts), 1, len(gps_ts) - 1)
+        left = right - 1
+        span = gps_ts[right] - gps_ts[left]
+        exact = (ts == gps_ts[left]) | (ts == gps_ts[right])
+        valid = (ts >= gps_ts[left]) & (ts <= gps_ts[right]) & ((span <= max_gap) | exact)
+        k = (ts - gps_ts[left])[valid] / span[valid]
+        out_lat[valid] = lat[left[valid]] + k * (lat[right[valid]] - lat[left[valid]])
+        out_lng[valid] = lng[left[valid]] + k * (lng[right[valid]] - lng[left[valid]])
+
+    return array.array('d', out_lat.tobytes()), array.array('d', out_lng.tobytes())
+
+
+def accel_at(ts, samples, window=WINDOW):
+    """
+    per time in ts (sorted): the accelerometer sample nearest to it and the peak magnitude of the samples within
+    +-window/2 ms, as lists of (x, y, z) or None and float or nan; samples is a sorted tgf.Samples
+
+    the window slides forward over the samples together with ts, O(len(ts) + len(samples))
+    """
+    half = window / 2
+    s_ts = samples.timestamp
+    magnitude = [math.sqrt(x * x + y * y + z * z) for x, y, z in zip(samples.x, samples.y, samples.z)]
+    n = len(s_ts)
+
+    nearest = []
+    peak = []
+    lo = hi = 0
+    for t in ts:
+        while lo < n and s_ts[lo] < t - half:
+            lo += 1
+        hi = max(hi, lo)
+        while hi < n and s_ts[hi] <= t + half:
+            hi += 1
+        if lo == hi:
+            nearest.append(None)
+            peak.append(NAN)
+            continue
+        best = min(range(lo, hi), key=lambda k: abs(s_ts[k] - t))
+        nearest.append((samples.x[best], samples.y[best], samples.z[best]))
+        peak.append(max(magnitude[lo:hi]))
+    return nearest, peak
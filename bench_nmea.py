@@ -0,0 +1,60 @@
+#!/bin/python
+
+import argparse
+import glob
+import os
+import time
+
+import nmea
+import track
+
+
+def load_lines(src):
+    lines = []
+    for filepath in sorted(glob.glob(os.path.join(src, '*.gps'))):
+        with open(filepath, encoding="latin-1") as f:
+            lines.extend(line for line in f if not line.isspace())
+    return lines
+
+
+def run(nmea_parser, lines):
+    start = time.perf_counter()
+    for nmea_string in lines:
+        try:
+            nmea_parser.process_message(nmea_string)
+        except nmea.ProcessMessageException:
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    python bench_nmea.py
+    python bench_nmea.py --src ./examples --repeat 10
+    """
+    parser = argparse.ArgumentParser(description='nmea.NMEA.process_message micro-benchmark')
+    parser.add_argument('--src', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples'),
+                        help='directory with *.gps files')
+    parser.add_argument('--repeat', type=int, default=5, help='passes over the corpus, best one is reported')
+    args = parser.parse_args()
+
+    lines = load_lines(args.src)
+    print('corpus: {0} lines from {1}'.format(len(lines), args.src))
+
+    cases = [
+        ('regexp', nmea.NMEA(fast=False)),
+        ('fast', nmea.NMEA()),
+        ('fast RMC only', nmea.NMEA(sentences=('RMC', ))),
+        ('fast RMC points', nmea.NMEA(sentences=('RMC', ), fields=track.FIELDS)),
+    ]
+
+    base = None
+    for name, nmea_parser in cases:
+        elapsed = min(run(nmea_parser, lines) for _ in range(args.repeat))
+        lps = len(lines) / elapsed
+        base = base or lps
+        print('{0:<16} {1:>12.0f} lines/sec  x{2:.2f}'.format(name, lps, lps / base))
+
+
+if __name__ == '__main__':
+    main()
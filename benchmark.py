@@ -0,0 +1,261 @@
+#!/bin/python
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import blackvue
+import nmea
+import track
+
+import logging
+
+DAY = 86400000  # ms, every copy of the example set is moved one day later
+TS_RE = re.compile(rb'^\[(\d+)\]', re.MULTILINE)
+NAME_RE = re.compile(r'^(\d{8}_\d{6})(.*)$')
+
+
+def synthesize(src, dst, files):
+    """
+    files .gps files in dst made from the src examples: copy c of the example set has every [ts] and the file name
+    moved by c days, so the corpus is one long time-ordered archive (checksums stay valid, they do not cover [ts])
+    """
+    examples = sorted(glob.glob(os.path.join(src, '*.gps')))
+    if not examples:
+        raise RuntimeError('no *.gps files in {0}'.format(src))
+    contents = []
+    for filepath in examples:
+        with open(filepath, mode='rb') as f:
+            contents.append((os.path.basename(filepath), f.read()))
+
+    for i in range(files):
+        copy, index = divmod(i, len(contents))
+        filename, data = contents[index]
+        offset = copy * DAY
+        if offset:
+            data = TS_RE.sub(lambda m: b'[%d]' % (int(m.group(1)) + offset), data)
+            m = NAME_RE.match(filename)
+            filename = blackvue.ts_short(blackvue.parse_time(m.group(1)) + offset) + m.group(2)
+        with open(os.path.join(dst, filename), mode='wb') as f:
+            f.write(data)
+
+
+def corpus_stats(input_files):
+    lines = 0
+    size = 0
+    for filepath in input_files:
+        with open(filepath, mode='rb') as f:
+            data = f.read()
+        size += len(data)
+        lines += sum(1 for line in data.split(b'\n') if line.strip())
+    return lines, size
+
+
+def reset_peak_rss():
+    """start a new RSS high-water mark (linux, /proc/self/clear_refs); elsewhere the peak stays process-wide"""
+    try:
+        with open('/proc/self/clear_refs', mode='w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_kb():
+    """VmHWM since the last reset_peak_rss on linux, ru_maxrss of the whole run elsewhere"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return _maxrss_kb(resource.RUSAGE_SELF)
+
+
+def workers_peak_rss_kb():
+    """ru_maxrss of the largest --jobs worker that has exited so far (workers are not tracked per stage)"""
+    return _maxrss_kb(resource.RUSAGE_CHILDREN)
+
+
+def _maxrss_kb(who):
+    rss = resource.getrusage(who).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+class Stages(object):
+    """
+    times pipeline stages, a stage reports throughput over the whole corpus and its own peak RSS; with
+    trace_memory also the peak of the python allocations the stage made on top of what it started with
+    (tracemalloc, which slows the stages down several times, so the times of such a run are not comparable)
+    """
+
+    def __init__(self, lines, size, jobs=1, trace_memory=False):
+        self.lines = lines
+        self.size = size
+        self.jobs = jobs
+        self.trace_memory = trace_memory
+        self.results = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        reset_peak_rss()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        result = {
+            'stage': name,
+            'seconds': round(elapsed, 4),
+            'lines_per_sec': round(self.lines / elapsed) if elapsed else None,
+            'mb_per_sec': round(self.size / elapsed / 1e6, 2) if elapsed else None,
+            'peak_rss_kb': peak_rss_kb(),
+            'workers_peak_rss_kb': workers_peak_rss_kb() if self.jobs > 1 else None,
+            'peak_alloc_kb': (tracemalloc.get_traced_memory()[1] - allocated) // 1024 if self.trace_memory else None,
+        }
+        self.results.append(result)
+        line = ('{stage:<24} {seconds:>9.3f} s {lines_per_sec:>12} lines/sec {mb_per_sec:>8} MB/sec '
+                '{peak_rss_kb:>9} KB peak RSS').format(**result)
+        if result['workers_peak_rss_kb'] is not None:
+            line += ' {workers_peak_rss_kb:>9} KB workers'.format(**result)
+        if result['peak_alloc_kb'] is not None:
+            line += ' {peak_alloc_kb:>9} KB allocated'.format(**result)
+        print(line)
+
+
+def load(input_files, args):
+    """process_input without its stdin probe"""
+    options = blackvue.parser_options(args)
+    nmea_records = blackvue.merge_records(blackvue.load_files(input_files, options, args.get('jobs') or 1))
+    return [nmea_records[ts] for ts in sorted(nmea_records.keys())]
+
+
+def run(input_files, out_dir, jobs, trace_memory=False):
+    lines, size = corpus_stats(input_files)
+    print('corpus: {0} files, {1} lines, {2:.1f} MB'.format(len(input_files), lines, size / 1e6))
+    stages = Stages(lines, size, jobs, trace_memory)
+
+    with stages.stage('nmea.process_message'):
+        nmea_parser = nmea.NMEA()
+        for filepath in input_files:
+            with open(filepath, encoding='latin-1') as f:
+                for _ in blackvue.read_messages(nmea_parser, f):
+                    pass
+
+    args = {'checksum': 'off', 'jobs': jobs, 'nmea': True, 'dst-dir': out_dir}
+    with stages.stage('process_input'):
+        nmea_data = load(input_files, args)
+
+    with stages.stage('split_tracks'):
+        series = blackvue.split_tracks(nmea_data)
+
+    with stages.stage('out_nmea'):
+        with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+            blackvue.out_nmea(args, series)
+
+    with stages.stage('out_geojson'):
+        with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+            blackvue.out_geojson(args, series)
+
+    del nmea_data, series
+    geojson_args = {'checksum': 'off', 'jobs': jobs, 'geojson': True, 'columnar': True}
+    with stages.stage('process_input (RMC)'):
+        points = track.Track.from_records(load(input_files, geojson_args))
+
+    with stages.stage('out_geojson (RMC)'):
+        with open(os.devnull, mode='w') as devnull, contextlib.redirect_stdout(devnull):
+            blackvue.out_geojson(geojson_args, blackvue.split_tracks(points))
+
+    return {'files': len(input_files), 'lines': lines, 'bytes': size}, stages.results
+
+
+def git_commit():
+    try:
+        process = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return process.stdout.decode('utf-8').strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, filepath):
+    with open(filepath) as f:
+        previous = {s['stage']: s for s in json.load(f)['stages']}
+    print('vs {0}:'.format(filepath))
+    for s in results['stages']:
+        p = previous.get(s['stage'])
+        if p and p['seconds'] and s['seconds']:
+            print('{0:<24} x{1:.2f}'.format(s['stage'], p['seconds'] / s['seconds']))
+
+
+def main():
+    """
+    python benchmark.py --files 290 --output /tmp/bench.json
+    python benchmark.py --files 290 --compare /tmp/bench.json
+    """
+    parser = argparse.ArgumentParser(description='blackvue.py pipeline benchmark over a synthesized .gps archive')
+    parser.add_argument('--src', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples'),
+                        help='directory with example *.gps files')
+    parser.add_argument('--files', type=int, default=29, help='number of .gps files to synthesize (1 .. 100000)')
+    parser.add_argument('--jobs', type=int, default=1, help='process_input worker processes')
+    parser.add_argument('--work-dir', default=None, help='where to put the corpus (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='keep the synthesized corpus')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also report the peak python allocations of every stage (tracemalloc, stages run slower)')
+    parser.add_argument('--output', default=None, help='write results as json to this file')
+    parser.add_argument('--compare', default=None, help='json results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    # corrupted example lines are logged once per copy otherwise
+    logging.getLogger('blackvue').setLevel(logging.ERROR)
+    logging.getLogger('nmea').setLevel(logging.ERROR)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='blackvue_bench_')
+    src_dir = os.path.join(work_dir, 'Record')
+    out_dir = os.path.join(work_dir, 'out')
+    os.makedirs(src_dir, exist_ok=True)
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        start = time.perf_counter()
+        synthesize(args.src, src_dir, args.files)
+        print('synthesized {0} files in {1:.1f} s under {2}'.format(args.files, time.perf_counter() - start, src_dir))
+
+        if args.trace_memory:
+            tracemalloc.start()
+        corpus, stages = run(sorted(blackvue.find_input_files(src_dir)), out_dir, args.jobs, args.trace_memory)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir if not args.work_dir else src_dir, ignore_errors=True)
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    results = {
+        'commit': git_commit(),
+        'time': blackvue.TS,
+        'python': platform.python_version(),
+        'numpy': nmea.numpy is not None,
+        'jobs': args.jobs,
+        'trace_memory': args.trace_memory,
+        'corpus': corpus,
+        'stages': stages,
+    }
+    if args.output:
+        with open(args.output, mode='w') as f:
+            json.dump(results, f, sort_keys=True, indent='  ')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/bin/python
+
+import array
+import os
+import struct
+import sys
+
+import track
+
+import logging
+logger = logging.getLogger(__name__)
+# logger.setLevel(logging.INFO)
+
+# .bvt layout, all little-endian:
+#   header: magic (8 bytes), number of points (uint64)
+#   then one block per track.COLUMNS entry, in that order: number of points * itemsize bytes
+# BVTRACK1 files have no speed_digits/course_digits blocks, they read back with -1 (unknown) there
+MAGIC = b'BVTRACK2'
+MAGIC_V1 = b'BVTRACK1'
+V1_COLUMNS = 6
+HEADER = struct.Struct('<8sQ')
+EXTENSION = 'bvt'
+
+
+def _column_bytes(column):
+    if sys.byteorder == 'little':
+        return memoryview(column).cast('B')
+    swapped = array.array(memoryview(column).format, column)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def write(f, t):
+    """write track t (a track.Track or a zero-copy chunk of one) to the binary file object f"""
+    f.write(HEADER.pack(MAGIC, len(t)))
+    for column in t.columns:
+        f.write(_column_bytes(column))
+
+
+def read(f):
+    """read one .bvt track from the binary file object f into a track.Track, no NMEA parsing involved"""
+    header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise RuntimeError('truncated bvt header')
+    magic, count = HEADER.unpack(header)
+    if magic not in (MAGIC, MAGIC_V1):
+        raise RuntimeError('not a bvt file (magic {0!r})'.format(magic))
+
+    t = track.Track()
+    columns = t.columns
+    if magic == MAGIC_V1:
+        for column in t.columns[V1_COLUMNS:]:
+            column.extend([-1] * count)
+        columns = t.columns[:V1_COLUMNS]
+    for column in columns:
+        size = count * column.itemsize
+        data = f.read(size)
+        if len(data) != size:
+            raise RuntimeError('truncated bvt column')
+        column.frombytes(data)
+        if sys.byteorder != 'little':
+            column.byteswap()
+    return t
+
+
+def dump(filepath, t):
+    with open(filepath, mode='wb') as f:
+        write(f, t)
+
+
+def load(filepath):
+    with open(filepath, mode='rb') as f:
+        return read(f)
+
+
+def load_all(path):
+    """one track from a .bvt file or from every .bvt file under a directory, ordered by first timestamp"""
+    if os.path.isdir(path):
+        filepaths = []
+        for root, dirs, files in os.walk(path):
+            filepaths.extend(os.path.join(root, f) for f in files if f.endswith('.' + EXTENSION))
+    else:
+        filepaths = [path]
+
+    tracks = [load(filepath) for filepath in filepaths]
+    tracks = sorted((t for t in tracks if len(t)), key=lambda t: t.timestamp[0])
+    logger.info('bintrack: %s files, %s points', len(filepaths), sum(len(t) for t in tracks))
+
+    result = track.Track()
+    for t in tracks:
+        result.extend(t)
+    return result
@@ -1,19 +1,35 @@
 #!/bin/python
 
 import argparse
+import bisect
+import calendar
+import configparser
 import datetime
+import functools
+import heapq
+import itertools
 import json
 import io
+import mmap
+import multiprocessing
 import os
 import pathlib
 import select
 import subprocess
 import sys
+import time
 
 from time import gmtime, strftime
 
+import align
+import bintrack
+import cache
+import geoindex
 import geojson
 import nmea
+import simplify
+import tgf
+import track
 
 import logging
 logger = logging.getLogger(__name__)
@@ -23,15 +39,20 @@ TS_ISO_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
 TS_SHORT_FORMAT = '%Y%m%d_%H%M%S'
 
 TS = strftime("%Y%m%d_%H%M%S", gmtime())
+TRACK_GAP = 5000  # ms without records that starts a new track
+CLIP_SLACK = 60000  # ms, records of a recording may start before / end after its file name time + clip length
+DEFAULT_CLIP_MINUTES = 3  # NormalRecordTime/EventRecordTime when there is no Config/config.ini
 DRY_RUN = True
 
 
 def ts_str(ts):
-    return datetime.datetime.fromtimestamp(ts / 1000.0).strftime(TS_ISO_FORMAT)
+    """TS_ISO_FORMAT of a [ts] value; [ts] is the dashcam wall clock, so no timezone is applied"""
+    return nmea.ms_iso(ts)
 
 
 def ts_short(ts):
-    return datetime.datetime.fromtimestamp(ts / 1000.0).strftime(TS_SHORT_FORMAT)
+    """TS_SHORT_FORMAT of a [ts] value"""
+    return nmea.ms_short(ts)
 
 
 def exec_cmd(cwd, cmd, *args):
@@ -52,11 +73,255 @@ def exec_cmd(cwd, cmd, *args):
             process.stderr.decode('utf-8'))
 
 
-def process_input(args):
-    src = args.get('src')
+def parse_time(value):
+    """--from/--to value (20170708_221449, 2017-07-08T22:14:49, 2017-07-08 22:14 or 2017-07-08) -> ms as in [ts]"""
+    for fmt in (TS_SHORT_FORMAT, '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(datetime.datetime.strptime(value, fmt).timetuple()) * 1000
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError('unknown time format: {0}'.format(value))
+
+
+def time_window(args):
+    """(from, to) ms of --from/--to, either end may be None; None without both"""
+    if args.get('from') is None and args.get('to') is None:
+        return None
+    return args.get('from'), args.get('to')
+
+
+def in_window(window, start, end):
+    return (window[0] is None or end >= window[0]) and (window[1] is None or start <= window[1])
+
+
+def clip_length(args):
+    """ms of the longest recording: NormalRecordTime/EventRecordTime (minutes) of Config/config.ini next to src-dir"""
+    filepath = args.get('config') or os.path.join(args.get('src-dir') or '.', os.pardir, 'Config', 'config.ini')
+    minutes = DEFAULT_CLIP_MINUTES
+    if os.path.exists(filepath):
+        config = configparser.ConfigParser(strict=False)
+        config.read(filepath, encoding='latin-1')
+        values = [config.getint(section, key, fallback=0) for section in config.sections()
+                  for key in ('NormalRecordTime', 'EventRecordTime')]
+        minutes = max(values + [0]) or DEFAULT_CLIP_MINUTES
+    logger.debug('clip_length: %s minutes (%s)', minutes, filepath)
+    return minutes * 60000
+
+
+def prune_dirs(dirs, window, clip=0):
+    """
+    drop day directories (YYYYMMDD or YYYY-MM-DD names) entirely outside the window, in place for os.walk; a
+    recording started late in the day runs into the next one by up to clip ms, as in select_window_files
+    """
+    for name in list(dirs):
+        day = name.replace('-', '')
+        if len(day) != 8 or not day.isdigit():
+            continue
+        try:
+            start = parse_time(day + '_000000')
+        except argparse.ArgumentTypeError:
+            continue
+        if not in_window(window, start - CLIP_SLACK, start + 86400000 + clip + CLIP_SLACK):
+            logger.debug('prune_dirs: skip [%s]', name)
+            dirs.remove(name)
+
+
+def find_input_files(src, suffix='.gps', window=None, clip=0):
+    input_files = []
+    for root, dirs, files in os.walk(src):
+        if window is not None:
+            prune_dirs(dirs, window, clip)
+        for filename in files:
+            filepath = os.path.join(root, filename)
+            if pathlib.Path(filepath).suffix != suffix:
+                continue
+            logger.debug('process_input: add file [%s]', filepath)
+            input_files.append(filepath)
+    return input_files
+
+
+def read_messages(nmea_parser, f, checksum_errors=None):
+    """
+    f: text lines, or a MappedFile (bytes lines)
+    checksum_errors: line numbers with a wrong checksum from nmea.checksum_errors, checked per line when None
+    """
+    process = nmea_parser.process_bytes if isinstance(f, MappedFile) else nmea_parser.process_message
+    idx = 0
+    for nmea_string in f:
+        idx += 1
+        if nmea_string.isspace():
+            continue
+        try:
+            if checksum_errors is None:
+                yield process(nmea_string)
+            else:
+                yield process(nmea_string, checksum_ok=idx not in checksum_errors)
+        except nmea.ProcessMessageSkippedLineException as e:
+            pass  # raise e
+        except nmea.ProcessMessageChecksumException as e:
+            logger.warning(e.log(idx))
+            if e.result is not None:
+                yield e.result
+        except nmea.ProcessMessageException as e:
+            logger.warning(e.log(idx))
+
+
+class MappedFile(object):
+    """
+    lines of a file mmap-ed read-only, as bytes (sliced straight from the mapping, lines end at b'\\n'); no
+    decoding here, nmea.NMEA.process_bytes only decodes the sentences it has to
+    """
+
+    def __init__(self, filepath):
+        self.f = open(filepath, mode='rb')
+        size = os.fstat(self.f.fileno()).st_size
+        # an empty file cannot be mapped
+        self.buffer = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __iter__(self):
+        if not self.buffer:
+            return iter(())
+        self.buffer.seek(0)
+        return iter(self.buffer.readline, b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.f.close()
+
+
+def open_input(filepath, options):
+    """
+    line iterator over an input file and the bulk checksum result for it; with checksum validation the file is
+    read once as bytes (or mapped), verified as a whole and then decoded
+    """
+    options = options or {}
+    if filepath == '<STDIN>':
+        return sys.stdin, None
+    if options.get('reader') == 'mmap':
+        f = MappedFile(filepath)
+        if options.get('checksum', 'off') == 'off':
+            return f, None
+        return f, nmea.checksum_errors(f.buffer)
+    if options.get('checksum', 'off') == 'off':
+        return open(filepath, encoding="latin-1"), None
+
+    with open(filepath, mode='rb') as f:
+        data = f.read()
+    # lines end at '\n' only, as in checksum_errors, so that a stray '\r' does not shift the line numbers
+    return io.TextIOWrapper(io.BytesIO(data), encoding="latin-1", newline='\n'), nmea.checksum_errors(data)
+
+
+def parser_options(args):
+    """
+    input options for the selected output: geojson and bin only read the RMC fields of a track point (so the fix
+    time is never decoded), nmea dumps every field
+    """
+    options = {'checksum': args.get('checksum') or 'off'}
+    if args.get('columnar') or ((args.get('geojson') or args.get('bin')) and not args.get('nmea')):
+        options['sentences'] = ('RMC', )
+        options['fields'] = track.FIELDS
+    if args.get('mmap'):
+        options['reader'] = 'mmap'
+    return options
+
+
+def nmea_options(options):
+    """the part of parser_options that changes parse results (nmea.NMEA arguments), also the cache key"""
+    return {k: v for k, v in (options or {}).items() if k in ('sentences', 'checksum', 'fields')}
+
+
+def parse_file(filepath, options=None):
+    """
+    parse one input file into {ts: record}; runs in a worker process in --jobs mode, so every call gets its
+    own nmea.NMEA
+    """
+    nmea_parser = nmea.NMEA(defer_coordinates=True, **nmea_options(options))
+
+    logger.info('process_input: file [%s]', filepath)
+    records = {}
+    try:
+        f, checksum_errors = open_input(filepath, options)
+        with f:
+            for ts, msg in read_messages(nmea_parser, f, checksum_errors):
+                records.setdefault(ts, {'timestamp': ts})
+                records[ts].update(msg)
+    except Exception as e:
+        logger.error('process_input: file [%s] skipped with error [%s]', filepath, e)
+        raise e
+    nmea.convert_coordinates(records.values())
+    return records
+
+
+def merge_records(files_records):
+    nmea_records = {}
+    for records in files_records:
+        for ts, record in records.items():
+            nmea_records.setdefault(ts, {'timestamp': ts})
+            nmea_records[ts].update(record)
+    return nmea_records
+
+
+def merge_columns(files_records):
+    """
+    merge_records straight into a track.Track: the records of every file are turned into columns on their own,
+    so there is no dict of the whole input (the parsed strings of RMC_speed/RMC_angle are kept as they are)
+    """
+    t = track.Track.merge([track.Track.from_records(records[ts] for ts in sorted(records.keys()))
+                           for records in files_records])
+    logger.info('track: %s points, %s bytes', len(t), t.nbytes())
+    return t
+
+
+def select_window_files(args, input_files, file_cache=None):
+    """
+    input files that may have records within the time window: the real first/last timestamp from the parsed-file
+    cache when the file is there, else the start time in the file name plus the clip length (from config.ini)
+    """
+    window = time_window(args)
+    clip = clip_length(args)
+    selected = []
+    for filepath in input_files:
+        span = file_cache.span(filepath) if file_cache is not None else None
+        if span is None:
+            start = tgf.file_start_ts(filepath)
+            if start is None:
+                selected.append(filepath)
+                continue
+            span = (start - CLIP_SLACK, start + clip + CLIP_SLACK)
+        if in_window(window, *span):
+            selected.append(filepath)
+    logger.info('select_window_files: %s of %s files', len(selected), len(input_files))
+    return selected
+
+
+def window_records(args, records):
+    """records (sorted by timestamp) within the time window, stops reading at its end"""
+    window = time_window(args)
+    if window is None:
+        return records
+    start, end = window
+    if start is not None:
+        records = itertools.dropwhile(lambda r: r['timestamp'] < start, records)
+    if end is not None:
+        records = itertools.takewhile(lambda r: r['timestamp'] <= end, records)
+    return records
 
-    nmea_parser = nmea.NMEA()
 
+def window_track(args, t):
+    window = time_window(args)
+    if window is None:
+        return t
+    start, end = window
+    i = 0 if start is None else bisect.bisect_left(t.timestamp, start)
+    j = len(t) if end is None else bisect.bisect_right(t.timestamp, end)
+    return t[i:j]
+
+
+def collect_input(args, file_cache=None):
     input_files = []
 
     if select.select([sys.stdin, ], [], [], 0.0)[0]:
@@ -67,77 +332,291 @@ def process_input(args):
         input_files.append('<STDIN>')
     else:
         logger.debug('process_input: read from filesystem')
-        for root, dirs, files in os.walk(src):
-            for filename in files:
-                filepath = os.path.join(root, filename)
-                if pathlib.Path(filepath).suffix != '.gps':
-                    continue
-                logger.debug('process_input: add file [%s]', filepath)
-                input_files.append(filepath)
+        input_files = find_input_files(args.get('src-dir'), window=time_window(args), clip=clip_length(args))
+        if time_window(args) is not None:
+            input_files = select_window_files(args, input_files, file_cache)
 
-    nmea_records = {}
-    for i, filepath in enumerate(input_files):
-        logger.info('process_input: file [%s]', filepath)
+    return input_files
+
+
+def parse_files(input_files, options, jobs):
+    """parse_file results of input_files, in input order"""
+    if jobs > 1 and len(input_files) > 1:
+        logger.debug('process_input: %s files, %s jobs', len(input_files), jobs)
+        pool = multiprocessing.Pool(jobs)
         try:
-            with sys.stdin if filepath == '<STDIN>' else open(filepath, encoding="latin-1") as f:
-                idx = 0
-                for nmea_string in f:
-                    idx += 1
-                    try:
-                        ts, msg = nmea_parser.process_message(nmea_string)
-
-                        nmea_records.setdefault(ts, {'timestamp': ts})
-                        nmea_records[ts].update(msg)
-                    except nmea.ProcessMessageSkippedLineException as e:
-                        pass  # raise e
-                    except nmea.ProcessMessageException as e:
-                        logger.warning(e.log(idx))
-        except Exception as e:
-            logger.error('process_input: file [%s] skipped with error [%s]', filepath, e)
-            raise e
+            # imap keeps the input order, so later files win on equal timestamps exactly as in the serial path
+            yield from pool.imap(functools.partial(parse_file, options=options), input_files,
+                                 chunksize=max(1, len(input_files) // (jobs * 4)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for filepath in input_files:
+            yield parse_file(filepath, options)
 
-    result = []
-    for r in sorted(nmea_records.keys()):
-        result.append(nmea_records[r])
 
-    return result
+def load_files(input_files, options, jobs, file_cache=None):
+    """parse_files behind the parsed-file cache: only changed or new files are parsed, and stored back"""
+    if file_cache is None or input_files == ['<STDIN>']:
+        yield from parse_files(input_files, options, jobs)
+        return
 
+    rowids = [file_cache.lookup(filepath, nmea_options(options)) for filepath in input_files]
+    parsed = parse_files([f for f, rowid in zip(input_files, rowids) if rowid is None], options, jobs)
+    for filepath, rowid in zip(input_files, rowids):
+        if rowid is None:
+            records = next(parsed)
+            file_cache.put(filepath, nmea_options(options), records)
+        else:
+            records = file_cache.load(rowid)
+        yield records
 
-def split_tracks(nmea_data):
-    if not len(nmea_data):
-        return []
 
-    chunks = []
-    idx = -1
+def open_cache(args):
+    if not args.get('cache-dir'):
+        return None
+    return cache.FileCache(args.get('cache-dir'), use_hash=args.get('cache-hash'))
+
+
+def process_input(args, file_cache=None):
+    jobs = args.get('jobs') or 1
+    options = parser_options(args)
+
+    input_files = collect_input(args, file_cache)
+
+    if args.get('columnar'):
+        return window_track(args, merge_columns(load_files(input_files, options, jobs, file_cache)))
+
+    nmea_records = merge_records(load_files(input_files, options, jobs, file_cache))
+    return list(window_records(args, (nmea_records[ts] for ts in sorted(nmea_records.keys()))))
+
+
+def gps_track(args, file_cache=None):
+    """RMC points of the *.gps files under src-dir (or of the bin-src tracks) as one track.Track"""
+    if args.get('bin-src'):
+        return bintrack.load_all(args.get('bin-src'))
+    options = parser_options(dict(args, columnar=True))
+    input_files = find_input_files(args.get('src-dir'))
+    return merge_columns(load_files(input_files, options, args.get('jobs') or 1, file_cache))
+
+
+def join_accel(args, records):
+    """ACC_x, ACC_y, ACC_z (nearest sample) and ACC_peak (peak magnitude around the point) on every record"""
+    samples = tgf.read_files(sorted(find_input_files(args.get('src-dir'), '.3gf'), key=os.path.basename))
+    nearest, peak = align.accel_at([r['timestamp'] for r in records], samples)
+    joined = 0
+    for record, xyz, p in zip(records, nearest, peak):
+        if xyz is None:
+            continue
+        record['ACC_x'], record['ACC_y'], record['ACC_z'] = xyz
+        record['ACC_peak'] = round(p, 3)
+        joined += 1
+    logger.info('join_accel: %s of %s records', joined, len(records))
+
+
+def to_track(records):
+    t = track.Track.from_records(records)
+    logger.info('track: %s points, %s bytes', len(t), t.nbytes())
+    return t
+
+
+def iter_file_messages(filepath, options=None, file_cache=None):
+    if file_cache is not None:
+        records = file_cache.get(filepath, nmea_options(options))
+        if records is None:
+            records = parse_file(filepath, options)
+            file_cache.put(filepath, nmea_options(options), records)
+        for ts in sorted(records.keys()):
+            yield ts, records[ts]
+        return
+
+    nmea_parser = nmea.NMEA(**nmea_options(options))
+
+    logger.info('stream_input: file [%s]', filepath)
+    try:
+        f, checksum_errors = open_input(filepath, options)
+        with f:
+            for ts, msg in read_messages(nmea_parser, f, checksum_errors):
+                yield ts, msg
+    except Exception as e:
+        logger.error('stream_input: file [%s] skipped with error [%s]', filepath, e)
+        raise e
+
+
+def merge_sources(sources):
+    """
+    k-way merge of time-ordered (ts, value) iterators into one (ts, value) stream; on equal timestamps the earlier
+    source comes first
+
+    sources must be ordered by their first timestamp (BlackVue filenames start with the recording start time, so
+    sorting by basename is enough). A source is opened only when the merge reaches its first timestamp, so the
+    number of open files is bounded by the number of recordings overlapping in time, not by the archive size.
+    """
+    sources = iter(sources)
+    heap = []
+    pending = None
+    seq = 0
+
+    while True:
+        while pending is None:
+            source = next(sources, None)
+            if source is None:
+                break
+            it = iter(source)
+            first = next(it, None)
+            if first is not None:
+                pending = (first[0], seq, first[1], it)
+                seq += 1
+
+        if pending is not None and (not heap or pending[0] <= heap[0][0]):
+            heapq.heappush(heap, pending)
+            pending = None
+            continue
+
+        if not heap:
+            break
+
+        ts, i, value, it = heap[0]
+        item = next(it, None)
+        if item is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (item[0], i, item[1], it))
+
+        yield ts, value
+
+
+def merge_messages(sources):
+    """merge_sources of (ts, msg) iterators combined into timestamp-sorted records"""
+    unordered = False
+
+    record = None
+    for ts, msg in merge_sources(sources):
+        if record is not None and record['timestamp'] == ts:
+            record.update(msg)
+            continue
+        if record is not None:
+            if ts < record['timestamp'] and not unordered:
+                unordered = True
+                logger.warning('stream_input: input is not time-ordered at ts=%s, output will be too', ts)
+            yield record
+        record = {'timestamp': ts}
+        record.update(msg)
+
+    if record is not None:
+        yield record
+
+
+def stream_input(args, file_cache=None):
+    options = parser_options(args)
+    input_files = sorted(collect_input(args, file_cache), key=os.path.basename)
+
+    if input_files == ['<STDIN>']:
+        # concatenated files may overlap in time (event recordings), so stdin cannot be merged on the fly
+        logger.info('stream_input: stdin is buffered and sorted')
+        nmea_records = merge_records([parse_file('<STDIN>', options)])
+        return window_records(args, (nmea_records[ts] for ts in sorted(nmea_records.keys())))
 
+    return window_records(
+        args, merge_messages(iter_file_messages(filepath, options, file_cache) for filepath in input_files))
+
+
+def iter_tracks(nmea_data):
+    if isinstance(nmea_data, track.Track):
+        yield from nmea_data.split(TRACK_GAP)
+        return
+
+    chunk = None
+
+    idx = -1
     last_ts = None
     for i, record in enumerate(nmea_data):
         ts = record.get('timestamp')
-        if not last_ts or ts - last_ts > 5000:
-            chunks.append([])
+        if not last_ts or ts - last_ts > TRACK_GAP:
+            if chunk:
+                yield chunk
+            chunk = []
             idx += 1
             logger.debug('chunk %s created. record=%s. ts=%s', idx, i, ts_short(ts))
         last_ts = ts
-        chunks[idx].append(record)
+        chunk.append(record)
+
+    if chunk:
+        yield chunk
+
+
+def split_tracks(nmea_data):
+    if not len(nmea_data):
+        return []
+
+    return list(iter_tracks(nmea_data))
+
+
+def peek_single(series):
+    """
+    return (chunk, None) if series holds exactly one chunk, (None, chunks) otherwise; series may be a generator,
+    only the first two chunks are pulled ahead
+    """
+    if isinstance(series, list):
+        return (series[0], None) if len(series) == 1 else (None, series)
+
+    series = iter(series)
+    head = list(itertools.islice(series, 2))
+    if len(head) == 1:
+        return head[0], None
+    return None, itertools.chain(head, series)
+
+
+def chunk_span(chunk):
+    if isinstance(chunk, track.Track):
+        return chunk.timestamp[0], chunk.timestamp[-1]
+    return chunk[0]['timestamp'], chunk[-1]['timestamp']
+
+
+def chunk_records(chunk):
+    if isinstance(chunk, track.Track):
+        return list(chunk.records())
+    if not isinstance(chunk, list):
+        return list(chunk)
+    return chunk
+
 
-    return chunks
+def chunk_track(chunk):
+    if isinstance(chunk, track.Track):
+        return chunk
+    return track.Track.from_records(chunk)
+
+
+def chunk_coordinates(chunk):
+    if isinstance(chunk, track.Track):
+        yield from chunk.coordinates()
+        return
+
+    for item in chunk:
+        ll = [item.get('RMC_lng'), item.get('RMC_lat')]
+        if ll[0] and ll[1]:
+            yield ll
 
 
 def out_nmea(args, series):
-    if len(series) == 1:
-        chunk = series[0]
+    chunk, series = peek_single(series)
+    if chunk is not None:
+        # '_ts' is written before the records, so a streamed track is collected first
+        records = chunk_records(chunk)
+        ts_start, ts_end = chunk_span(records)
         out = {
-            '_ts': [ts_str(chunk[0]['timestamp']), ts_str(chunk[-1]['timestamp'])],
-            'records': chunk
+            '_ts': [ts_str(ts_start), ts_str(ts_end)],
+            'records': records
         }
         sys.stdout.write(json.dumps(out, sort_keys=True, indent='  '))
     else:
         for i, chunk in enumerate(series):
-            ts_start, ts_end = chunk[0]['timestamp'], chunk[-1]['timestamp']
+            ts_start, ts_end = chunk_span(chunk)
             ts_start_str, ts_end_str = ts_str(ts_start), ts_str(ts_end)
             out = {
                 '_ts': [ts_start_str, ts_end_str],
-                'records': chunk
+                'records': chunk_records(chunk)
             }
             logger.debug('%s. %s', i, (ts_start_str, ts_end_str))
 
@@ -147,41 +626,265 @@ def out_nmea(args, series):
                 f.write(json.dumps(out, sort_keys=True, indent='  '))
 
 
+def geojson_writer(args, f):
+    return geojson.GeoJsonWriter(f, indent=None if args.get('compact') else '  ', ndjson=args.get('ndjson'))
+
+
+def geojson_simplifier(args):
+    if not args.get('simplify'):
+        return None
+    return simplify.Simplifier(args.get('simplify'), args.get('simplify-method'))
+
+
+def geojson_coordinates(chunk, simplifier=None):
+    if simplifier is None:
+        return chunk_coordinates(chunk)
+    return simplifier(chunk_coordinates(chunk))
+
+
 def out_geojson(args, series):
-    if len(series) == 1:
-        gj = geojson.GeoJsonFeatureCollection()
-        for i, r in enumerate(series[0]):
-            ll = [r.get('RMC_lng'), r.get('RMC_lat')]
-            if ll[0] and ll[1]:
-                gj.add_point(ll)
-        sys.stdout.write(gj.dump())
+    simplifier = geojson_simplifier(args)
+    with geojson_writer(args, sys.stdout) as gj:
+        for s in series:
+            gj.add_line_string(geojson_coordinates(s, simplifier))
+    if simplifier is not None:
+        simplifier.log()
+
+
+def out_bin(args, series):
+    chunk, series = peek_single(series)
+    if chunk is not None:
+        bintrack.write(sys.stdout.buffer, chunk_track(chunk))
     else:
-        gj = geojson.GeoJsonFeatureCollection()
-        for i, s in enumerate(series):
-            gj_ls = geojson.LineString()
-            for item in s:
-                ll = [item.get('RMC_lng'), item.get('RMC_lat')]
-                if ll[0] and ll[1]:
-                    gj_ls.add_point(ll)
-            gj.add_feature(gj_ls)
-        sys.stdout.write(gj.dump())
+        for i, chunk in enumerate(series):
+            filename = track_filename(chunk, bintrack.EXTENSION)
+            logger.debug('%s. %s', i, filename)
+            bintrack.dump(os.path.join(args.get('dst-dir', './'), filename), chunk_track(chunk))
+
+
+def track_filename(chunk, extension):
+    ts_start, ts_end = chunk_span(chunk)
+    return 'track_{0}_{1}.{2}'.format(ts_short(ts_start), ts_short(ts_end), extension)
+
+
+def write_track_files(args, chunk, simplifier=None):
+    """
+    one file per selected format for a single track, as out_nmea writes them; returns the filenames. simplifier
+    is the one of the whole run (geojson_simplifier), so its totals cover every track
+    """
+    dst_dir = args.get('dst-dir')
+    outputs = []
+
+    if args.get('nmea'):
+        ts_start, ts_end = chunk_span(chunk)
+        out = {
+            '_ts': [ts_str(ts_start), ts_str(ts_end)],
+            'records': chunk_records(chunk)
+        }
+        filename = track_filename(chunk, 'nmea')
+        with open(os.path.join(dst_dir, filename), mode='w+') as f:
+            f.write(json.dumps(out, sort_keys=True, indent='  '))
+        outputs.append(filename)
+
+    if args.get('geojson'):
+        filename = track_filename(chunk, 'geojson')
+        with open(os.path.join(dst_dir, filename), mode='w+') as f, geojson_writer(args, f) as gj:
+            gj.add_line_string(geojson_coordinates(chunk, simplifier))
+        outputs.append(filename)
+
+    if args.get('bin'):
+        filename = track_filename(chunk, bintrack.EXTENSION)
+        bintrack.dump(os.path.join(dst_dir, filename), chunk_track(chunk))
+        outputs.append(filename)
+
+    return outputs
+
+
+MANIFEST_FILENAME = '.blackvue_manifest.json'
+
+
+def load_manifest(dst_dir):
+    """
+    files: [size, mtime_ns, first ts, last ts] by absolute path; tracks: span and output files of every closed
+    track, in time order; open_track: records and output files of the last track, which new files may extend
+    """
+    filepath = os.path.join(dst_dir, MANIFEST_FILENAME)
+    manifest = {}
+    if os.path.exists(filepath):
+        with open(filepath) as f:
+            manifest = json.load(f)
+    manifest.setdefault('files', {})
+    manifest.setdefault('tracks', [])
+    manifest.setdefault('open_track', {'records': [], 'outputs': []})
+    return manifest
+
+
+def save_manifest(dst_dir, manifest):
+    filepath = os.path.join(dst_dir, MANIFEST_FILENAME)
+    with open(filepath + '.tmp', mode='w') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(filepath + '.tmp', filepath)
+
+
+def remove_outputs(dst_dir, outputs):
+    for filename in outputs:
+        filepath = os.path.join(dst_dir, filename)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+def file_reaches(info, ts):
+    """whether a manifest files entry may have records at or after ts (entries of older manifests have no span)"""
+    return len(info) < 4 or info[3] is None or info[3] >= ts
+
+
+def process_gps_incremental(args, file_cache=None):
+    """
+    parse only the .gps files that are not in the manifest of dst-dir yet, together with the records of the last
+    (open) track of the previous run; the open track is extended or closed by the new records exactly as
+    split_tracks would do it, and only its files and the files of new tracks are (re)written. New records that
+    reach back into closed tracks (an event file synced late) reopen them: the known files with records from the
+    first such track on are parsed again (through the cache) and the tracks from there are rewritten
+    """
+    dst_dir = args.get('dst-dir')
+    options = parser_options(args)
+    jobs = args.get('jobs') or 1
+    manifest = load_manifest(dst_dir)
+    known_files = manifest['files']
+
+    new_files = []
+    for filepath in find_input_files(args.get('src-dir')):
+        st = os.stat(filepath)
+        if known_files.get(os.path.abspath(filepath), [])[:2] != [st.st_size, st.st_mtime_ns]:
+            new_files.append(filepath)
+
+    if not new_files:
+        logger.info('process_gps_incremental: no new files')
+        return []
+
+    logger.info('process_gps_incremental: %s new files', len(new_files))
+    new_records = []
+    for filepath, records in zip(new_files, load_files(new_files, options, jobs, file_cache)):
+        st = os.stat(filepath)
+        span = [min(records), max(records)] if records else [None, None]
+        known_files[os.path.abspath(filepath)] = [st.st_size, st.st_mtime_ns] + span
+        new_records.append(records)
+
+    files_records = [{r['timestamp']: r for r in manifest['open_track']['records']}]
+    reopened = []
+    first_ts = min((min(records) for records in new_records if records), default=None)
+    if first_ts is not None:
+        # closed tracks the new records may join or precede (tracks are in time order, so this is a tail)
+        closed = manifest['tracks']
+        i = bisect.bisect_left([t['span'][1] for t in closed], first_ts - TRACK_GAP)
+        closed[i:], reopened = [], closed[i:]
+
+    if reopened:
+        start = reopened[0]['span'][0]
+        new_keys = set(map(os.path.abspath, new_files))
+        old_files = [key for key, info in known_files.items()
+                     if key not in new_keys and os.path.exists(key) and file_reaches(info, start)]
+        logger.info('process_gps_incremental: %s closed tracks reopened, %s files parsed again',
+                    len(reopened), len(old_files))
+        for records in load_files(old_files, options, jobs, file_cache):
+            files_records.append({ts: r for ts, r in records.items() if ts >= start})
+
+    nmea_records = merge_records(files_records + new_records)
+    chunks = list(iter_tracks(nmea_records[ts] for ts in sorted(nmea_records.keys())))
+    if not chunks:
+        logger.info('process_gps_incremental: no records in the new files')
+        save_manifest(dst_dir, manifest)
+        return []
+
+    for t in reopened:
+        remove_outputs(dst_dir, t['outputs'])
+    remove_outputs(dst_dir, manifest['open_track']['outputs'])
+
+    simplifier = geojson_simplifier(args) if args.get('geojson') else None
+    written = []
+    for chunk in chunks[:-1]:
+        outputs = write_track_files(args, chunk, simplifier)
+        manifest['tracks'].append({'span': list(chunk_span(chunk)), 'outputs': outputs})
+        written.extend(outputs)
+    outputs = write_track_files(args, chunks[-1], simplifier)
+    written.extend(outputs)
+    logger.info('process_gps_incremental: %s tracks closed, open track %s', len(chunks) - 1, outputs)
+    if simplifier is not None:
+        simplifier.log()
+
+    manifest['open_track'] = {'records': chunks[-1], 'outputs': outputs}
+    save_manifest(dst_dir, manifest)
+    return written
+
+
+def watch_gps(args):
+    interval = args.get('watch-interval')
+    logger.info('watch_gps: polling [%s] every %ss', args.get('src-dir'), interval)
+    while True:
+        file_cache = open_cache(args)
+        try:
+            process_gps_incremental(args, file_cache)
+        except Exception as e:
+            # a half-synced card or a full disk must not stop the watcher, the next poll retries
+            logger.exception('watch_gps: run failed with error [%s]', e)
+        finally:
+            if file_cache is not None:
+                file_cache.close()
+        time.sleep(interval)
 
 
 def process_gps(args):
-    nmea_data = process_input(args)
+    if args.get('watch'):
+        watch_gps(args)
+        return
+
+    file_cache = open_cache(args)
+    try:
+        if args.get('incremental'):
+            process_gps_incremental(args, file_cache)
+        else:
+            write_gps(args, file_cache)
+    finally:
+        if file_cache is not None:
+            file_cache.close()
+
+
+def write_gps(args, file_cache=None):
+    if args.get('bin-src'):
+        nmea_data = window_track(args, bintrack.load_all(args.get('bin-src')))
+        series = [nmea_data]
+        if args.get('split-files') or args.get('split-tracks'):
+            series = iter_tracks(nmea_data)
+    elif args.get('stream') and args.get('columnar'):
+        nmea_data = to_track(stream_input(args, file_cache))
+        series = [nmea_data]
+        if args.get('split-files') or args.get('split-tracks'):
+            series = iter_tracks(nmea_data)
+    elif args.get('stream'):
+        nmea_data = stream_input(args, file_cache)
+        # a single track is passed on as the record generator, geojson and bin output never hold it in memory
+        series = [nmea_data]
+        if args.get('split-files') or args.get('split-tracks'):
+            series = iter_tracks(nmea_data)
+    else:
+        nmea_data = process_input(args, file_cache)
 #        print(nmea_data)
+        if args.get('join-3gf'):
+            join_accel(args, nmea_data)
 
-    series = [
-        nmea_data
-    ]
+        series = [
+            nmea_data
+        ]
 
-    if args.get('split-files') or args.get('split-tracks'):
-        series = split_tracks(nmea_data)
+        if args.get('split-files') or args.get('split-tracks'):
+            series = split_tracks(nmea_data)
 
     if args.get('nmea'):
         out_nmea(args, series)
     elif args.get('geojson'):
         out_geojson(args, series)
+    elif args.get('bin'):
+        out_bin(args, series)
 
     # for i, ch in enumerate(chunks):
     #     chunk = chunks[ch]
@@ -204,6 +907,168 @@ def process_gps(args):
     #         f.write(gj.dump())
 
 
+def process_3gf(args):
+    """
+    all *.3gf files under src-dir as one time-ordered csv (timestamp in ms as in .gps files, raw x, y, z); join-gps
+    adds the position at every sample, interpolated between the RMC fixes of the *.gps files (or bin-src tracks)
+    """
+    input_files = sorted(find_input_files(args.get('src-dir'), '.3gf'), key=os.path.basename)
+    samples = tgf.read_files(input_files)
+
+    positions = None
+    if args.get('join-gps'):
+        file_cache = open_cache(args)
+        try:
+            gps_ts, lat, lng = align.fixes(gps_track(args, file_cache))
+        finally:
+            if file_cache is not None:
+                file_cache.close()
+        positions = align.interpolate(gps_ts, lat, lng, samples.timestamp)
+        logger.info('process_3gf: %s fixes joined', len(gps_ts))
+
+    if args.get('dst-file'):
+        with open(args.get('dst-file'), mode='w+') as f:
+            tgf.write_csv(f, samples, positions)
+    else:
+        tgf.write_csv(sys.stdout, samples, positions)
+
+
+EPOCH_SENTENCES = (b'RMC', b'VTG', b'GGA', b'GLL', b'ZDA')  # sent once per fix
+
+
+def line_key(line):
+    """
+    (ts, sentence) dedup key of a raw .gps line, None without a [ts] prefix; sentence is the sentence type for
+    EPOCH_SENTENCES, type and message number for GSV (several parts per fix) and the whole line for anything else
+    (GSA per constellation, TXT, corrupted lines)
+    """
+    end = line.find(b']')
+    if line[:1] != b'[' or end < 2 or not line[1:end].isdigit():
+        return None
+    body = line[end + 1:]
+    fields = body.split(b',', 3)
+    sentence = fields[0]
+    if sentence[-3:] in EPOCH_SENTENCES:
+        pass
+    elif sentence.endswith(b'GSV') and len(fields) > 2:
+        sentence += b',' + fields[2]
+    else:
+        sentence = body
+    return int(line[1:end]), sentence
+
+
+def iter_file_lines(filepath, stats):
+    """(ts, (sentence, line)) of the non-blank lines of a .gps file as raw bytes, lines without [ts] are counted"""
+    with open(filepath, mode='rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            key = line_key(line)
+            if key is None:
+                stats['dropped'] += 1
+                continue
+            yield key[0], (key[1], line)
+
+
+def merge_day(input_files, f, stats):
+    """one day of recordings merged into f (.gps layout), a (ts, sentence) seen before is written once"""
+    last_ts = None
+    seen = set()
+    for ts, (sentence, line) in merge_sources(iter_file_lines(filepath, stats) for filepath in input_files):
+        if ts != last_ts:
+            last_ts = ts
+            seen.clear()
+        if sentence in seen:
+            stats['duplicates'] += 1
+            continue
+        seen.add(sentence)
+        f.write(line)
+        f.write(b'\n\n')
+        stats['lines'] += 1
+
+
+def merge_days(args):
+    """
+    native merge_gps.sh: all *.gps files under src-dir (--from/--to apply) merged into dst-dir/YYYYMMDD.gps, one
+    streaming k-way merge per day of the file name
+    """
+    input_files = find_input_files(args.get('src-dir'), window=time_window(args), clip=clip_length(args))
+    if time_window(args) is not None:
+        input_files = select_window_files(args, input_files)
+
+    days = {}
+    for filepath in sorted(input_files, key=os.path.basename):
+        day = os.path.basename(filepath)[:8]
+        if not day.isdigit():
+            logger.warning('merge_days: no date in file name [%s], skipped', filepath)
+            continue
+        days.setdefault(day, []).append(filepath)
+
+    for day, day_files in sorted(days.items()):
+        stats = {'lines': 0, 'duplicates': 0, 'dropped': 0}
+        filepath = os.path.join(args.get('dst-dir'), day + '.gps')
+        with open(filepath + '.tmp', mode='wb') as f:
+            merge_day(day_files, f, stats)
+        os.replace(filepath + '.tmp', filepath)
+        logger.info('merge_days: [%s] %s files, %s lines, %s duplicates, %s lines without timestamp',
+                    filepath, len(day_files), stats['lines'], stats['duplicates'], stats['dropped'])
+
+
+def build_index(args):
+    """add the RMC positions of new or changed *.gps files under src-dir to the spatial index"""
+    index = geoindex.GeoIndex(args.get('index'))
+    file_cache = open_cache(args)
+    try:
+        input_files = [f for f in find_input_files(args.get('src-dir')) if not index.is_current(f)]
+        logger.info('build_index: %s new or changed files', len(input_files))
+
+        options = parser_options(dict(args, columnar=True))
+        files_records = load_files(input_files, options, args.get('jobs') or 1, file_cache)
+        for filepath, records in zip(input_files, files_records):
+            points = [(ts, r.get('RMC_lat'), r.get('RMC_lng')) for ts, r in sorted(records.items())
+                      if r.get('RMC_lat') and r.get('RMC_lng')]
+            cells = index.add(filepath, points)
+            logger.debug('build_index: [%s] %s points, %s cells', filepath, len(points), cells)
+
+        logger.info('build_index: %s recordings, %s cells', *index.stats())
+    finally:
+        index.close()
+        if file_cache is not None:
+            file_cache.close()
+
+
+def query_index(args):
+    """recordings with points in query-bbox or within query-near, as json"""
+    index = geoindex.GeoIndex(args.get('index'))
+    try:
+        start = time.perf_counter()
+        if args.get('query-bbox'):
+            found = index.query(*args.get('query-bbox'))
+        else:
+            found = index.query_near(*args.get('query-near'))
+        logger.info('query_index: %s recordings in %.1f ms', len(found), (time.perf_counter() - start) * 1000)
+    finally:
+        index.close()
+
+    out = [{
+        'recording': item['recording'],
+        'path': item['path'],
+        '_ts': [ts_str(item['first_ts']), ts_str(item['last_ts'])],
+        'points': item['points'],
+    } for item in found]
+    sys.stdout.write(json.dumps(out, sort_keys=True, indent='  '))
+
+
+def float_list(n):
+    def parse(value):
+        values = [float(v) for v in value.split(',')]
+        if len(values) != n:
+            raise argparse.ArgumentTypeError('expected {0} comma separated numbers'.format(n))
+        return values
+    return parse
+
+
 def init():
     fullFormatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     # fullFormatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -220,7 +1085,13 @@ def init():
     logger.addHandler(fh)
 
     nmea.logger = logger
+    simplify.logger = logger
     geojson.logger = logger
+    track.logger = logger
+    cache.logger = logger
+    tgf.logger = logger
+    align.logger = logger
+    geoindex.logger = logger
 
 
 def main():
@@ -237,14 +1108,56 @@ def main():
 
     # process-gps
     parser.add_argument('--process-gps', action='store_true', help='process *.gps files')
+    parser.add_argument('--process-3gf', action='store_true', help='process *.3gf (accelerometer) files to csv')
+    parser.add_argument('--join-gps', action='store_true', help='--process-3gf: add interpolated lat, lng columns')
+    parser.add_argument('--join-3gf', action='store_true',
+                        help='--process-gps: add accelerometer values (ACC_*) to every nmea record')
+    parser.add_argument('--build-index', action='store_true', help='add *.gps files under --src-dir to --index')
+    parser.add_argument('--query-bbox', type=float_list(4), default=None, metavar='MIN_LAT,MIN_LNG,MAX_LAT,MAX_LNG',
+                        help='recordings with points in the bounding box, from --index')
+    parser.add_argument('--query-near', type=float_list(3), default=None, metavar='LAT,LNG,METRES',
+                        help='recordings that passed within METRES of LAT,LNG, from --index')
+    parser.add_argument('--index', default=None, help='spatial index (sqlite) file')
+    parser.add_argument('--merge-days', action='store_true',
+                        help='merge *.gps files under --src-dir into one deduplicated --dst-dir/YYYYMMDD.gps per day')
     parser.add_argument('--nmea', action='store_true', help='save nmea files')
     parser.add_argument('--geojson', action='store_true', help='save geojson files')
+    parser.add_argument('--bin', action='store_true', help='save binary .bvt track files (RMC fields only)')
+    parser.add_argument('--compact', action='store_true', help='geojson without indentation')
+    parser.add_argument('--ndjson', action='store_true', help='geojson as one Feature per line (no FeatureCollection)')
+    parser.add_argument('--simplify', type=float, default=None,
+                        help='simplify geojson tracks, tolerance in metres')
+    parser.add_argument('--simplify-method', default='visvalingam', choices=simplify.METHODS,
+                        help='visvalingam (area based, O(n log n)) or dp (Douglas-Peucker, max distance)')
     parser.add_argument('--split-files', action='store_true', help='split output by rides')
     parser.add_argument('--split-tracks', action='store_true', help='split tracks in one geojson file')
+    parser.add_argument('--jobs', type=int, default=1, help='parse input files in N worker processes')
+    parser.add_argument('--stream', action='store_true',
+                        help='merge time-ordered input files on the fly (a single --nmea track is still held in memory)')
+    parser.add_argument('--columnar', action='store_true',
+                        help='keep RMC points in a compact columnar track (nmea output has RMC fields only)')
+    parser.add_argument('--mmap', action='store_true', help='read input files through mmap, as raw bytes')
+    parser.add_argument('--checksum', default='off', choices=nmea.CHECKSUM_MODES,
+                        help='NMEA checksum validation: drop (strict) or log (warn) lines with a wrong checksum')
+
+    parser.add_argument('--incremental', action='store_true',
+                        help='only parse files that are new since the last run, rewrite the affected track files')
+    parser.add_argument('--watch', action='store_true', help='run --incremental again every --watch-interval')
+    parser.add_argument('--watch-interval', type=float, default=60.0, help='seconds between --watch polls')
+
+    parser.add_argument('--cache-dir', default=None, help='keep parsed .gps files in a cache under this path')
+    parser.add_argument('--cache-hash', action='store_true', help='also check file content hash on cache hits')
+
+    parser.add_argument('--from', type=parse_time, default=None, dest='from_ts',
+                        help='only records since this time (20170708_221449 or 2017-07-08T22:14:49)')
+    parser.add_argument('--to', type=parse_time, default=None, dest='to_ts', help='only records until this time')
+    parser.add_argument('--config', default=None,
+                        help='config.ini with NormalRecordTime/EventRecordTime (default: SRC_DIR/../Config/config.ini)')
 
     parser.add_argument('--src-dir', default=None, help='src path')
     parser.add_argument('--dst-dir', default=None, help='dst path')
     parser.add_argument('--dst-file', default=None, help='dst path')
+    parser.add_argument('--bin-src', default=None, help='read tracks from a .bvt file or directory instead of *.gps')
 
     args = parser.parse_args()
 
@@ -253,11 +1166,35 @@ def main():
         'dry-run': args.dry_run,
         'nmea': args.nmea,
         'geojson': args.geojson,
+        'bin': args.bin,
+        'compact': args.compact,
+        'ndjson': args.ndjson,
+        'simplify': args.simplify,
+        'simplify-method': args.simplify_method,
         'split-files': args.split_files,
         'split-tracks': args.split_tracks,
+        'jobs': args.jobs,
+        'stream': args.stream,
+        'checksum': args.checksum,
+        'mmap': args.mmap,
+        'columnar': args.columnar,
+        'incremental': args.incremental or args.watch,
+        'watch': args.watch,
+        'watch-interval': args.watch_interval,
+        'cache-dir': args.cache_dir,
+        'cache-hash': args.cache_hash,
+        'from': args.from_ts,
+        'to': args.to_ts,
+        'config': args.config,
         'src-dir': args.src_dir,
         'dst-dir': args.dst_dir,
         'dst-file': args.dst_file,
+        'bin-src': args.bin_src,
+        'join-gps': args.join_gps,
+        'join-3gf': args.join_3gf,
+        'index': args.index,
+        'query-bbox': args.query_bbox,
+        'query-near': args.query_near,
     }
 
     if global_args.get('debug'):
@@ -267,17 +1204,54 @@ def main():
 
     logger.info('ARGS: %s, TS: %s', global_args, TS)
 
-    if not global_args.get('nmea') and not global_args.get('geojson'):
-        raise RuntimeError('USAGE: --process-gps AND (--nmea AND/OR --geojson)')
+    if args.build_index or args.query_bbox or args.query_near:
+        if not global_args.get('index') or (args.build_index and not global_args.get('src-dir')):
+            raise RuntimeError('USAGE: (--build-index AND --src-dir OR --query-bbox OR --query-near) AND --index')
+        if args.build_index:
+            build_index(global_args)
+        else:
+            query_index(global_args)
+        return
 
-    if global_args.get('nmea') and global_args.get('geojson'):
+    if args.merge_days:
+        if not global_args.get('src-dir') or not global_args.get('dst-dir'):
+            raise RuntimeError('USAGE: --merge-days AND --src-dir AND --dst-dir')
+        merge_days(global_args)
+        return
+
+    if args.process_3gf:
+        if not global_args.get('src-dir'):
+            raise RuntimeError('USAGE: --process-3gf AND --src-dir')
+        process_3gf(global_args)
+        return
+
+    outputs = [o for o in ('nmea', 'geojson', 'bin') if global_args.get(o)]
+    if not outputs:
+        raise RuntimeError('USAGE: --process-gps AND (--nmea AND/OR --geojson AND/OR --bin)')
+
+    if len(outputs) > 1:
         if global_args.get('dst-file') or not global_args.get('dst-dir'):
             raise RuntimeError('USAGE: (--nmea AND --geojson) AND --dst-dir AND NOT --dst-file')
 
+    if time_window(global_args) is not None and global_args.get('incremental'):
+        raise RuntimeError('USAGE: (--from OR --to) AND NOT (--incremental OR --watch)')
+
+    if global_args.get('bin-src') and global_args.get('incremental'):
+        raise RuntimeError('USAGE: --bin-src AND NOT (--incremental OR --watch)')
+
+    if global_args.get('join-3gf'):
+        if not global_args.get('src-dir') or [o for o in ('stream', 'columnar', 'bin-src', 'incremental')
+                                              if global_args.get(o)]:
+            raise RuntimeError('USAGE: --join-3gf AND --src-dir AND NOT (--stream OR --columnar OR --bin-src)')
+
     if global_args.get('split-files'):
         if global_args.get('dst-file') or not global_args.get('dst-dir'):
             raise RuntimeError('USAGE: --split-files AND --dst-dir AND NOT --dst-file')
 
+    if global_args.get('incremental'):
+        if global_args.get('dst-file') or not global_args.get('dst-dir') or not global_args.get('src-dir'):
+            raise RuntimeError('USAGE: (--incremental OR --watch) AND --src-dir AND --dst-dir AND NOT --dst-file')
+
     if args.process_gps:
         process_gps(global_args)
     else:
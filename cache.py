@@ -0,0 +1,110 @@
+#!/bin/python
+
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+
+import logging
+logger = logging.getLogger(__name__)
+# logger.setLevel(logging.INFO)
+
+CACHE_FILENAME = 'blackvue_cache.sqlite'
+
+
+def file_digest(filepath):
+    h = hashlib.sha1()
+    with open(filepath, mode='rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class FileCache(object):
+    """
+    parsed records of every input file ({ts: record}, as blackvue.parse_file returns them) in a sqlite database
+    under cache_dir
+
+    an entry is valid while the file keeps its size and mtime (and content hash with use_hash); variant tells
+    apart results of different nmea.NMEA options for the same file
+    """
+
+    def __init__(self, cache_dir, use_hash=False):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.use_hash = use_hash
+        self.db = sqlite3.connect(os.path.join(cache_dir, CACHE_FILENAME))
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT,
+                first_ts INTEGER,
+                last_ts INTEGER,
+                data BLOB NOT NULL,
+                PRIMARY KEY (path, variant)
+            )''')
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    @staticmethod
+    def variant(options):
+        return json.dumps(options or {}, sort_keys=True)
+
+    def lookup(self, filepath, options):
+        """rowid of a valid entry for filepath, None on a miss"""
+        st = os.stat(filepath)
+        row = self.db.execute(
+            'SELECT rowid, size, mtime_ns, digest FROM files WHERE path = ? AND variant = ?',
+            (os.path.abspath(filepath), self.variant(options))).fetchone()
+
+        valid = row is not None and row[1] == st.st_size and row[2] == st.st_mtime_ns
+        if valid and self.use_hash:
+            valid = row[3] == file_digest(filepath)
+
+        if not valid:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def span(self, filepath):
+        """(first_ts, last_ts) of filepath over its valid entries, None if there are none; size/mtime check only"""
+        st = os.stat(filepath)
+        spans = [(first_ts, last_ts) for size, mtime_ns, first_ts, last_ts in self.db.execute(
+            'SELECT size, mtime_ns, first_ts, last_ts FROM files WHERE path = ?', (os.path.abspath(filepath), ))
+            if size == st.st_size and mtime_ns == st.st_mtime_ns and first_ts is not None]
+        if not spans:
+            return None
+        return min(s[0] for s in spans), max(s[1] for s in spans)
+
+    def load(self, rowid):
+        data, = self.db.execute('SELECT data FROM files WHERE rowid = ?', (rowid, )).fetchone()
+        self.bytes_read += len(data)
+        return {r['timestamp']: r for r in json.loads(zlib.decompress(data).decode('utf-8'))}
+
+    def get(self, filepath, options):
+        rowid = self.lookup(filepath, options)
+        return None if rowid is None else self.load(rowid)
+
+    def put(self, filepath, options, records):
+        st = os.stat(filepath)
+        data = zlib.compress(json.dumps(list(records.values()), separators=(',', ':')).encode('utf-8'))
+        self.bytes_written += len(data)
+        self.db.execute(
+            'INSERT OR REPLACE INTO files (path, variant, size, mtime_ns, digest, first_ts, last_ts, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (os.path.abspath(filepath), self.variant(options), st.st_size, st.st_mtime_ns,
+             file_digest(filepath) if self.use_hash else None,
+             min(records) if records else None, max(records) if records else None, data))
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+        logger.info('cache: %s hits, %s misses, %s bytes read, %s bytes written',
+                    self.hits, self.misses, self.bytes_read, self.bytes_written)
@@ -0,0 +1,154 @@
+#!/bin/python
+
+import array
+import math
+import os
+import sqlite3
+import sys
+
+import logging
+logger = logging.getLogger(__name__)
+# logger.setLevel(logging.INFO)
+
+CELL = 0.01  # degrees, ~1.1 km of latitude
+EARTH_RADIUS = 6371008.8  # m, mean radius
+
+
+def cell(lat, lng):
+    return math.floor(lat / CELL), math.floor(lng / CELL)
+
+
+def pack(points):
+    """(ts, lat, lng) list -> bytes: the ts, lat and lng columns one after another, little-endian"""
+    columns = [array.array('q'), array.array('d'), array.array('d')]
+    for point in points:
+        for column, value in zip(columns, point):
+            column.append(value)
+    if sys.byteorder != 'little':
+        for column in columns:
+            column.byteswap()
+    return b''.join(c.tobytes() for c in columns)
+
+
+def unpack(data):
+    n = len(data) // 24
+    columns = [array.array('q'), array.array('d'), array.array('d')]
+    for i, column in enumerate(columns):
+        column.frombytes(data[i * n * 8:(i + 1) * n * 8])
+        if sys.byteorder != 'little':
+            column.byteswap()
+    return zip(*columns)
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """haversine, m"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex(object):
+    """
+    RMC positions of every recording in a sqlite database, bucketed into CELL x CELL degree grid cells
+
+    a row holds the points of one recording (.gps file base name) within one cell, so a query reads only the cells
+    it overlaps and checks their points exactly, the .gps files are not needed
+    """
+
+    def __init__(self, filepath):
+        dirname = os.path.dirname(filepath)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.db = sqlite3.connect(filepath)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS recordings (
+                recording TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            )''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS cells (
+                cell_lat INTEGER NOT NULL,
+                cell_lng INTEGER NOT NULL,
+                recording TEXT NOT NULL,
+                first_ts INTEGER NOT NULL,
+                last_ts INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (cell_lat, cell_lng, recording)
+            )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS cells_recording ON cells (recording)')
+
+    @staticmethod
+    def recording(filepath):
+        return os.path.splitext(os.path.basename(filepath))[0]
+
+    def is_current(self, filepath):
+        st = os.stat(filepath)
+        row = self.db.execute('SELECT size, mtime_ns FROM recordings WHERE recording = ?',
+                              (self.recording(filepath), )).fetchone()
+        return row is not None and tuple(row) == (st.st_size, st.st_mtime_ns)
+
+    def add(self, filepath, points):
+        """(re)index one recording; points are (ts, lat, lng) of its fixes"""
+        recording = self.recording(filepath)
+        st = os.stat(filepath)
+
+        cells = {}
+        for point in points:
+            cells.setdefault(cell(point[1], point[2]), []).append(point)
+
+        self.db.execute('DELETE FROM cells WHERE recording = ?', (recording, ))
+        self.db.executemany(
+            'INSERT INTO cells (cell_lat, cell_lng, recording, first_ts, last_ts, data) VALUES (?, ?, ?, ?, ?, ?)',
+            ((c[0], c[1], recording, min(p[0] for p in ps), max(p[0] for p in ps), pack(ps))
+             for c, ps in cells.items()))
+        self.db.execute('INSERT OR REPLACE INTO recordings (recording, path, size, mtime_ns) VALUES (?, ?, ?, ?)',
+                        (recording, os.path.abspath(filepath), st.st_size, st.st_mtime_ns))
+        return len(cells)
+
+    def query(self, min_lat, min_lng, max_lat, max_lng, match=None):
+        """
+        [{'recording', 'path', 'first_ts', 'last_ts', 'points'}] of the recordings with points in the bounding box
+        (and for which match(lat, lng) is true), first_ts/last_ts/points only count the matching points
+        """
+        (cell_lat0, cell_lng0), (cell_lat1, cell_lng1) = cell(min_lat, min_lng), cell(max_lat, max_lng)
+        rows = self.db.execute(
+            'SELECT c.recording, r.path, c.data FROM cells c JOIN recordings r ON r.recording = c.recording '
+            'WHERE c.cell_lat BETWEEN ? AND ? AND c.cell_lng BETWEEN ? AND ?',
+            (cell_lat0, cell_lat1, cell_lng0, cell_lng1))
+
+        found = {}
+        for recording, path, data in rows:
+            for ts, lat, lng in unpack(data):
+                if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+                    continue
+                if match is not None and not match(lat, lng):
+                    continue
+                item = found.get(recording)
+                if item is None:
+                    found[recording] = {
+                        'recording': recording, 'path': path, 'first_ts': ts, 'last_ts': ts, 'points': 1}
+                else:
+                    item['first_ts'] = min(item['first_ts'], ts)
+                    item['last_ts'] = max(item['last_ts'], ts)
+                    item['points'] += 1
+
+        return sorted(found.values(), key=lambda item: item['first_ts'])
+
+    def query_near(self, lat, lng, radius):
+        """recordings that passed within radius m of lat, lng"""
+        dlat = math.degrees(radius / EARTH_RADIUS)
+        dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        return self.query(lat - dlat, lng - dlng, lat + dlat, lng + dlng,
+                          lambda p_lat, p_lng: distance(lat, lng, p_lat, p_lng) <= radius)
+
+    def stats(self):
+        recordings, = self.db.execute('SELECT COUNT(*) FROM recordings').fetchone()
+        cells, = self.db.execute('SELECT COUNT(*) FROM cells').fetchone()
+        return recordings, cells
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
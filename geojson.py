@@ -124,3 +124,101 @@ class GeoJson(object):
 
     def dump(self):
         return json.dumps(self.data, sort_keys=True, indent='  ')
+
+
+class GeoJsonWriter(object):
+    """
+    writes a FeatureCollection of LineStrings to the file object f as the features come in, nothing is kept in memory
+
+    indent='  ' gives the same text as GeoJsonFeatureCollection.dump(), indent=None a compact one-line document;
+    with ndjson every Feature is written as one compact line and there is no FeatureCollection around them
+    """
+
+    SENTINEL = '\0'
+
+    def __init__(self, f, indent='  ', ndjson=False, properties=None):
+        self.f = f
+        self.ndjson = ndjson
+        self.properties = properties or {}
+        if ndjson:
+            indent = None
+        separators = (',', ': ') if indent is not None else (',', ':')
+        self.encode = json.JSONEncoder(sort_keys=True, indent=indent, separators=separators).encode
+
+        self.collection_head, self.feature_sep, self.collection_tail = self.template(
+            {"type": "FeatureCollection", "features": [self.SENTINEL]})
+        self.feature_head, self.point_sep, self.feature_tail = self.template(
+            {"type": "Feature", "geometry": {"type": "LineString", "coordinates": [self.SENTINEL]},
+             "properties": self.properties})
+
+        self.features = 0
+        self.points = 0
+        self.closed = False
+
+    def template(self, obj):
+        """(text before the list item, separator between items, text after it) around SENTINEL in encode(obj)"""
+        s = self.encode(obj)
+        token = self.encode(self.SENTINEL)
+        i = s.index(token)
+        head, tail = s[:i], s[i + len(token):]
+        prefix = head[head.rfind('\n') + 1:] if '\n' in head else ''
+        return head, ',' + ('\n' + prefix if prefix else ''), tail
+
+    def indented(self, s, sep):
+        # nested values go one level deeper, at the indentation of the list they are items of
+        return s.replace('\n', sep[1:]) if len(sep) > 1 else s
+
+    def add_line_string(self, coordinates):
+        """write one LineString Feature, skipped (as in GeoJsonFeatureCollection.data) if it has no points"""
+        points = 0
+        parts = None
+        for p in coordinates:
+            if not p:
+                continue
+            if parts is None:
+                parts = self.start_feature()
+            else:
+                parts.append(self.point_sep)
+            parts.append(self.indented(self.encode(p), self.point_sep))
+            points += 1
+            if len(parts) > 4096:
+                self.write_feature(parts)
+                parts = []
+        if parts is not None:
+            parts.append(self.feature_tail)
+            self.write_feature(parts)
+            if self.ndjson:
+                self.f.write('\n')
+        self.points += points
+        return points
+
+    def start_feature(self):
+        if not self.ndjson:
+            self.f.write(self.feature_sep if self.features else self.collection_head)
+        self.features += 1
+        return [self.feature_head]
+
+    def write_feature(self, parts):
+        text = ''.join(parts)
+        if not self.ndjson:
+            text = self.indented(text, self.feature_sep)
+        self.f.write(text)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.ndjson:
+            return
+        if self.features:
+            self.f.write(self.collection_tail)
+        else:
+            self.f.write(self.collection_head.rstrip() + self.collection_tail.lstrip())
+        logger.debug('geojson: %s features, %s points', self.features, self.points)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
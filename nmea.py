@@ -1,18 +1,186 @@
 #!/bin/python
 
-import datetime
+import array
+import collections.abc
+import functools
+import itertools
+import operator
 import re
 
 import logging
 logger = logging.getLogger(__name__)
 # logger.setLevel(logging.INFO)
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 # [1500310610235]$GPGLL,5355.68249,N,02738.67852,E,135648.00,A,A*63
 LINE_RE_STRING = r'\[([0-9]+)\]\$GP([A-Z]+),(.+)\*([0-9a-zA-Z]+)'
 LINE_RE = re.compile(LINE_RE_STRING)
 
 
+def split_message(nmea_string):
+    """
+    fast path for LINE_RE: cut '[ts]$GPxxx,args*cs' at the first ',' and the last '*' instead of running the
+    regexp; returns (ts, cmd, args, checksum) or None when the line does not have exactly this shape, in which case
+    the caller falls back to LINE_RE (corrupted lines, odd checksums)
+    """
+    head, _, rest = nmea_string.partition(',')
+    args, _, checksum = rest.rpartition('*')
+    if not args or head[:1] != '[' or head[-7:-3] != ']$GP':
+        return None
+
+    ts, cmd = head[1:-7], head[-3:]
+    if not (ts.isdecimal() and ts.isascii()):
+        return None
+    if not (cmd.isalpha() and cmd.isupper() and cmd.isascii()):
+        return None
+    if not (checksum.isalnum() and checksum.isascii()):
+        return None
+
+    return int(ts), cmd, args, checksum
+
+
+CHECKSUM_MODES = ('off', 'warn', 'strict')
+
+
+def xor_bytes(data):
+    """
+    XOR of all bytes of data; the bytes are read as one integer which is folded in halves, so the work is done by
+    a few big-int operations instead of a python loop per character
+    """
+    x = int.from_bytes(data, 'little')
+    width = len(data)
+    while width > 1:
+        half = (width + 1) // 2
+        x = (x & ((1 << (8 * half)) - 1)) ^ (x >> (8 * half))
+        width = half
+    return x
+
+
+def checksum(nmea_string):
+    """(computed, transmitted) checksum of '...$body*XX', transmitted is None if it is not a hex number"""
+    start, end = nmea_string.find('$'), nmea_string.rfind('*')
+    if start < 0 or end < start:
+        return None, None
+    computed = xor_bytes(nmea_string[start + 1:end].encode('latin-1', 'replace'))
+    return computed, _hex_byte(nmea_string[end + 1:end + 3].encode('latin-1', 'replace'))
+
+
+def checksum_errors(data):
+    """
+    1-based numbers of the b'\\n' separated lines of data whose '$...*XX' checksum does not match; lines without a
+    '$' or '*' are not checked here (they do not parse anyway)
+    """
+    if numpy is not None:
+        return _checksum_errors_numpy(data)
+
+    # one regexp pass over the whole buffer, ('$', body, digits) per line, ('', '', '') when there is nothing to check
+    lines = _LINE_CHECKSUM_RE.findall(bytes(data))
+    has = list(map(bool, map(operator.itemgetter(0), lines)))
+    numbers = list(itertools.compress(range(1, len(lines) + 1), has))
+    checked = list(itertools.compress(lines, has))
+
+    errors = set()
+    for i in range(0, len(checked), _FOLD_LINES):
+        block = checked[i:i + _FOLD_LINES]
+        computed = _xor_each(list(map(operator.itemgetter(1), block)))
+        transmitted = map(_HEX_VALUES.get, map(operator.itemgetter(2), block), itertools.repeat(None))
+        errors.update(itertools.compress(numbers[i:i + _FOLD_LINES], map(operator.ne, computed, transmitted)))
+    return errors
+
+
+# first '$', body up to the last '*' and the two characters after it, for every line (empty groups if none)
+_LINE_CHECKSUM_RE = re.compile(rb'^(?:[^$\n]*(\$)([^\n]*)\*([^\n]{0,2}))?[^\n]*$', re.MULTILINE)
+
+# nmea sentences are at most 82 characters, longer bodies are corrupted lines and are folded one by one
+_FOLD_WIDTH = 128
+_FOLD_LINES = 4096
+
+
+@functools.lru_cache(maxsize=None)
+def _fold_mask(half):
+    return int.from_bytes((b'\xff' * half + b'\0' * half) * (_FOLD_LINES * _FOLD_WIDTH // (2 * half)), 'little')
+
+
+def _xor_each(bodies):
+    """
+    XOR of every body: the bodies are padded to _FOLD_WIDTH bytes and read as one integer, which is folded in
+    halves like xor_bytes does, so all lines of a block are reduced by a few big-int operations
+    """
+    if max(map(len, bodies), default=0) > _FOLD_WIDTH:
+        return bytes(map(xor_bytes, bodies))
+
+    x = int.from_bytes(b''.join(map(operator.methodcaller('ljust', _FOLD_WIDTH, b'\0'), bodies)), 'little')
+    half = _FOLD_WIDTH
+    while half > 1:
+        half //= 2
+        mask = _fold_mask(half)
+        x = (x & mask) ^ ((x >> (8 * half)) & mask)
+    return x.to_bytes(len(bodies) * _FOLD_WIDTH, 'little')[::_FOLD_WIDTH]
+
+
+# hex digit value of every byte, 255 for non-hex bytes
+_HEX_TABLE = bytes(int(chr(c), 16) if chr(c) in '0123456789abcdefABCDEF' else 255 for c in range(256))
+
+
+def _hex_byte(digits):
+    if len(digits) != 2 or _HEX_TABLE[digits[0]] == 255 or _HEX_TABLE[digits[1]] == 255:
+        return None
+    return _HEX_TABLE[digits[0]] << 4 | _HEX_TABLE[digits[1]]
+
+
+# value of every two-digit hex checksum
+_HEX_VALUES = {bytes((hi, lo)): _hex_byte(bytes((hi, lo)))
+               for hi in b'0123456789abcdefABCDEF' for lo in b'0123456789abcdefABCDEF'}
+
+
+def _checksum_errors_numpy(data):
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    if not len(buf):
+        return set()
+
+    ends = numpy.flatnonzero(buf == 10)
+    starts = numpy.concatenate(([0], ends + 1))
+    ends = numpy.concatenate((ends, [len(buf)]))
+
+    # first '$' and last '*' of every line
+    dollars = numpy.flatnonzero(buf == 36)
+    stars = numpy.flatnonzero(buf == 42)
+    di = numpy.searchsorted(dollars, starts)
+    si = numpy.searchsorted(stars, ends) - 1
+    has = (di < len(dollars)) & (si >= 0)
+    d = dollars[numpy.minimum(di, len(dollars) - 1)] if len(dollars) else numpy.zeros_like(starts)
+    s = stars[numpy.maximum(si, 0)] if len(stars) else numpy.zeros_like(starts)
+    has &= (d < ends) & (s >= starts) & (s > d)
+    lines = numpy.flatnonzero(has)
+    d, s, ends = d[lines], s[lines], ends[lines]
+
+    # xor of buf[d + 1:s] from the running xor of the whole buffer
+    acc = numpy.bitwise_xor.accumulate(buf)
+    computed = acc[s - 1] ^ acc[d]
+
+    # two hex digits after '*', through a byte -> value table
+    table = numpy.frombuffer(_HEX_TABLE, dtype=numpy.uint8)
+    padded = numpy.concatenate((buf, [0, 0]))
+    hi, lo = table[padded[s + 1]], table[padded[s + 2]]
+    valid = (hi != 255) & (lo != 255) & (s + 2 < ends)
+    transmitted = (hi.astype(numpy.uint16) << 4) | lo
+
+    bad = ~valid | (computed != transmitted)
+    return set((lines[bad] + 1).tolist())
+
+
+def match_message(nmea_string):
+    m = LINE_RE.match(nmea_string)
+    if not m:
+        return None
+    return int(m.group(1)), m.group(2), m.group(3), m.group(4)
+
+
 def dm2d(nmea_value):
     """
     According to the NMEA Standard, Latitude and Longitude are output in the format Degrees, Minutes and
@@ -36,18 +204,215 @@ def dm2d(nmea_value):
 
 
 def lat(nmea_lat, north_south):
-    return dm2d(nmea_lat)
+    value = dm2d(nmea_lat)
+    return -value if north_south == 'S' else value
 
 
 def lng(nmea_lng, east_west):
-    return dm2d(nmea_lng)
+    value = dm2d(nmea_lng)
+    return -value if east_west == 'W' else value
+
+
+# record keys holding a coordinate, NMEA(defer_coordinates=True) leaves them as (ddmm.mmmm, hemisphere) tuples
+COORDINATE_KEYS = ('RMC_lat', 'RMC_lng', 'GLL_lat', 'GLL_lng')
+NEGATIVE_HEMISPHERES = ('S', 'W')
+
+
+def dm2d_batch(values, hemispheres=None):
+    """
+    dm2d of a whole column: values are ddmm.mmmm strings, hemispheres the matching N/S or E/W flags (S and W give
+    negative degrees); returns an array.array('d'), nan where a value is not a number
+
+    one vectorized pass with numpy when it is installed; the arithmetic is the one of dm2d, so both paths give
+    exactly the same floats
+    """
+    if numpy is not None and len(values):
+        try:
+            fv = numpy.array(values, dtype=numpy.str_).astype(numpy.float64)
+        except ValueError:
+            fv = None
+        if fv is not None:
+            degrees = numpy.trunc(fv / 100.0)
+            with numpy.errstate(invalid='ignore'):
+                result = degrees + (fv - degrees * 100) / 60
+            if hemispheres is not None:
+                negative = numpy.isin(numpy.array(hemispheres, dtype=numpy.str_), NEGATIVE_HEMISPHERES)
+                result = numpy.where(negative, -result, result)
+            return array.array('d', result.tobytes())
+
+    result = array.array('d', bytes(8 * len(values)))
+    for i, value in enumerate(values):
+        try:
+            fv = float(value)
+            degrees = float(int(fv / 100.0))
+        except (ValueError, OverflowError):
+            # not a number, or 'nan' / 'inf'
+            result[i] = float('nan')
+            continue
+        value = degrees + (fv - degrees * 100) / 60
+        if hemispheres is not None and hemispheres[i] in NEGATIVE_HEMISPHERES:
+            value = -value
+        result[i] = value
+    return result
+
+
+def convert_coordinates(records):
+    """
+    batch step of NMEA(defer_coordinates=True): every deferred COORDINATE_KEYS value of records (dicts) is
+    converted with one dm2d_batch call per key; a sentence with an invalid coordinate loses its fields, as the
+    handler would have rejected it
+    """
+    records = list(records)
+    for key in COORDINATE_KEYS:
+        deferred = [r for r in records if type(r.get(key)) is tuple]
+        if not deferred:
+            continue
+        values = dm2d_batch([r[key][0] for r in deferred], [r[key][1] for r in deferred])
+        for record, value in zip(deferred, values):
+            if value != value:
+                logger.warning('[%s] invalid coordinate %s=%s, sentence dropped', record.get('timestamp'), key,
+                               record[key])
+                prefix = key.split('_')[0] + '_'
+                for k in [k for k in record if k.startswith(prefix)]:
+                    del record[k]
+                continue
+            record[key] = value
+    return records
+
+
+def days_from_civil(year, month, day):
+    """days since 1970-01-01 of a proleptic Gregorian date (H. Hinnant's algorithm, integer arithmetic only)"""
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def civil_from_days(days):
+    """(year, month, day) of days since 1970-01-01, inverse of days_from_civil"""
+    days += 719468
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + (3 if mp < 10 else -9)
+    return yoe + era * 400 + (month <= 2), month, day
+
+
+DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _digits(value, count):
+    if len(value) != count or not (value.isdigit() and value.isascii()):
+        raise ValueError('expected {0} digits: {1!r}'.format(count, value))
+    return int(value)
+
+
+@functools.lru_cache(maxsize=256)
+def fix_second(fix_date, hhmmss):
+    """
+    epoch seconds of an NMEA ddmmyy date and hhmmss time (two-digit years as strptime's %y: 69-99 are 19xx);
+    memoized, all sentences of a fix and the fractions of a second share one entry
+    """
+    day, month, year = _digits(fix_date[:2], 2), _digits(fix_date[2:4], 2), _digits(fix_date[4:], 2)
+    hour, minute, second = _digits(hhmmss[:2], 2), _digits(hhmmss[2:4], 2), _digits(hhmmss[4:], 2)
+    year += 1900 if year >= 69 else 2000
+    leap = year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    if not (1 <= month <= 12 and 1 <= day <= (29 if leap and month == 2 else DAYS_IN_MONTH[month - 1])):
+        raise ValueError('invalid date: {0!r}'.format(fix_date))
+    if not (hour < 24 and minute < 60 and second < 60):
+        raise ValueError('invalid time: {0!r}'.format(hhmmss))
+    return days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60 + second
+
+
+def split_fix_time(fix_time):
+    """'hhmmss.ss' -> ('hhmmss', 'ss'), as strptime's '%H%M%S.%f' accepts it (1 to 6 fraction digits)"""
+    hhmmss, dot, fraction = fix_time.partition('.')
+    if not dot or not 1 <= len(fraction) <= 6 or not (fraction.isdigit() and fraction.isascii()):
+        raise ValueError('invalid time: {0!r}'.format(fix_time))
+    return hhmmss, fraction
+
+
+def fix_ms(fix_date, fix_time):
+    """epoch ms of an NMEA ddmmyy date and hhmmss.ss time"""
+    hhmmss, fraction = split_fix_time(fix_time)
+    return fix_second(fix_date, hhmmss) * 1000 + int(fraction[:3].ljust(3, '0'))
+
+
+@functools.lru_cache(maxsize=256)
+def second_iso(seconds):
+    """'YYYY-MM-DDTHH:MM:SS' of epoch seconds, memoized"""
+    days, rest = divmod(seconds, 86400)
+    year, month, day = civil_from_days(days)
+    return '{0:04d}-{1:02d}-{2:02d}T{3:02d}:{4:02d}:{5:02d}'.format(
+        year, month, day, rest // 3600, rest // 60 % 60, rest % 60)
+
+
+def ms_iso(ts):
+    """'%Y-%m-%dT%H:%M:%S.%fZ' of epoch ms ts"""
+    seconds, ms = divmod(ts, 1000)
+    return '{0}.{1:03d}000Z'.format(second_iso(seconds), ms)
+
+
+def ms_short(ts):
+    """'%Y%m%d_%H%M%S' of epoch ms ts"""
+    s = second_iso(ts // 1000)
+    return s[0:4] + s[5:7] + s[8:10] + '_' + s[11:13] + s[14:16] + s[17:19]
 
 
 def nmea_datetime(fix_date, fix_time):
+    """
+    '%Y-%m-%dT%H:%M:%S.%fZ' of an RMC fix, through fix_ms; fix_date and fix_time are fixed-width fields
+    (ddmmyy, hhmmss.s to hhmmss.ssssss), the shorter or space-padded fields strptime also took raise ValueError
+    """
     # "RMC_date": "090717",
     # "RMC_fix_time": "055554.00",
-    dt = datetime.datetime.strptime(' '.join((fix_date, fix_time, )), '%d%m%y %H%M%S.%f')
-    return dt.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    ms = fix_ms(fix_date, fix_time)
+    # ms_iso pads the microseconds with zeros, the digits below a millisecond are the ones of the fix
+    return ms_iso(ms)[:-4] + fix_time.partition('.')[2][3:].ljust(3, '0') + 'Z'
+
+
+class LazyMessage(collections.abc.Mapping):
+    """
+    handler result whose expensive fields are decoded on first access: values holds the ready fields, decoders
+    maps the others to (function, args); a decoded field is kept, a decoder error is raised by the access
+    """
+
+    __slots__ = ('values', 'decoders')
+
+    def __init__(self, values, decoders):
+        self.values = values
+        self.decoders = decoders
+
+    def __getitem__(self, key):
+        try:
+            return self.values[key]
+        except KeyError:
+            pass
+        function, args = self.decoders[key]
+        value = self.values[key] = function(*args)
+        return value
+
+    def __contains__(self, key):
+        # Mapping.__contains__ would go through __getitem__ and decode the field
+        return key in self.values or key in self.decoders
+
+    def __iter__(self):
+        yield from self.values
+        for key in self.decoders:
+            if key not in self.values:
+                yield key
+
+    def __len__(self):
+        return len(self.values) + sum(1 for key in self.decoders if key not in self.values)
+
+    def __repr__(self):
+        return 'LazyMessage({0!r}, pending={1!r})'.format(
+            self.values, [key for key in self.decoders if key not in self.values])
 
 
 class ProcessMessageException(Exception):
@@ -95,6 +460,22 @@ class ProcessMessageRegExpCheckException(ProcessMessageException):
         ProcessMessageException.__init__(self, msg=msg)
 
 
+class ProcessMessageChecksumException(ProcessMessageException):
+
+    exception = 'CHK'
+
+    def __init__(self, msg, computed, transmitted, result=None):
+        ProcessMessageException.__init__(self, msg=msg)
+        self.computed = computed
+        self.transmitted = transmitted
+        self.result = result
+
+    def message(self):
+        return 'checksum: computed {0}, transmitted {1}'.format(
+            '%02X' % self.computed if self.computed is not None else None,
+            '%02X' % self.transmitted if self.transmitted is not None else None)
+
+
 class ProcessMessageArgsCheckException(ProcessMessageException):
 
     exception = 'ARG'
@@ -111,7 +492,23 @@ class ProcessMessageArgsCheckException(ProcessMessageException):
 
 class NMEA(object):
 
-    def __init__(self):
+    def __init__(self, sentences=None, fast=True, checksum='off', defer_coordinates=False, fields=None):
+        """
+        sentences: sentence types (e.g. ('RMC', )) to decode; other sentences only yield their timestamp
+        fast: use split_message before LINE_RE (False keeps the plain regexp path, for benchmarks)
+        checksum: one of CHECKSUM_MODES; 'strict' drops lines with a wrong checksum, 'warn' keeps them
+        defer_coordinates: leave lat/lng as (ddmm.mmmm, hemisphere) for one convert_coordinates pass over the records
+        fields: record keys (e.g. ('RMC_lat', 'RMC_lng')) the caller reads; messages carry only these, and the fields
+            a LazyMessage would decode on access (RMC_fix_datetime, ...) are never decoded when they are not listed
+        """
+        if checksum not in CHECKSUM_MODES:
+            raise ValueError('unknown checksum mode {0}'.format(checksum))
+        self.sentences = frozenset(sentences) if sentences else None
+        self.sentences_bytes = frozenset(s.encode('ascii') for s in sentences) if sentences else None
+        self.fast = fast
+        self.checksum = checksum
+        self.defer_coordinates = defer_coordinates
+        self.fields = tuple(fields) if fields else None
         self.handlers = {
             'RMC': (self.handler_RMC, 12),  # minimum recommended data
             'VTG': (self.handler_VTG, 9),  # vector track and speed over ground
@@ -123,16 +520,61 @@ class NMEA(object):
             'GSV': (self.handler_GSV, 0),  # detailed satellite data, missing on some Garmin models
         }
 
-    def process_message(self, nmea_string):
+    def process_message(self, nmea_string, checksum_ok=None):
+        """
+        checksum_ok: result of a bulk check (checksum_errors) for this line, computed here when None
+
+        with checksum='warn' a mismatch raises ProcessMessageChecksumException carrying the parsed (ts, msg) in
+        its result, so the caller can log it with the line number and still use the message
+        """
         nmea_string = nmea_string.strip()
         if not nmea_string:
             raise ProcessMessageSkippedLineException()
 
-        m = LINE_RE.match(nmea_string)
-        if not m:
+        if self.checksum != 'off':
+            if not checksum_ok:
+                computed, transmitted = checksum(nmea_string)
+                checksum_ok = computed is None or computed == transmitted
+            if not checksum_ok:
+                if self.checksum == 'strict':
+                    raise ProcessMessageChecksumException(nmea_string, computed, transmitted)
+                raise ProcessMessageChecksumException(nmea_string, computed, transmitted,
+                                                      result=self.decode_message(nmea_string))
+
+        return self.decode_message(nmea_string)
+
+    def process_bytes(self, line, checksum_ok=None):
+        """
+        process_message for a raw bytes line (mmap reader): a sentence the caller did not ask for is answered from
+        the bytes, only the others are decoded (latin-1, as the text reader does)
+        """
+        if self.fast and self.sentences is not None and (self.checksum == 'off' or checksum_ok):
+            line = line.strip()
+            close = line.find(b']$GP')
+            cmd = line[close + 4:close + 7]
+            ts = line[1:close]
+            if close >= 2 and line[:1] == b'[' and line[close + 7:close + 8] == b',' and \
+                    cmd not in self.sentences_bytes and cmd.isalpha() and ts.isdigit():
+                return (int(ts), {})
+
+        return self.process_message(line.decode('latin-1'), checksum_ok)
+
+    def decode_message(self, nmea_string):
+        if self.fast and self.sentences is not None:
+            ts = self.skip_message(nmea_string)
+            if ts is not None:
+                return (ts, {})
+
+        parts = split_message(nmea_string) if self.fast else None
+        if parts is None:
+            parts = match_message(nmea_string)
+        if parts is None:
             raise ProcessMessageRegExpCheckException(nmea_string)
 
-        ts, cmd, args, checksum = int(m.group(1)), m.group(2), m.group(3), m.group(4)
+        ts, cmd, args, checksum = parts
+        if self.sentences is not None and cmd not in self.sentences:
+            return (ts, {})
+
         handler, args_count = self.handlers.get(cmd, (self.handler_dafault, 0))
 
         # print('A: {0} -> {1}'.format(line, (ts, cmd, args)))
@@ -141,9 +583,15 @@ class NMEA(object):
             raise ProcessMessageArgsCheckException(nmea_string, cmd, len(args), args_count)
 
         msg = None
-        logger.debug('[%s] %s. %s fields %s CS=%s', ts, cmd, len(args), args, checksum)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('[%s] %s. %s fields %s CS=%s', ts, cmd, len(args), args, checksum)
         try:
             msg = handler(cmd, *args)
+            if msg is not None:
+                if self.fields is not None:
+                    msg = {key: msg[key] for key in self.fields if key in msg}
+                elif isinstance(msg, LazyMessage):
+                    msg = dict(msg)
         except ProcessMessageHandlerException as e:
             raise ProcessMessageHandlerException('{0} {1}'.format(repr(nmea_string), e))
         except Exception as e:
@@ -151,6 +599,22 @@ class NMEA(object):
 
         return (ts, msg)
 
+    def skip_message(self, nmea_string):
+        """timestamp of a sentence the caller did not ask for, read without looking at its fields; None otherwise"""
+        close = nmea_string.find(']$GP')
+        cmd = nmea_string[close + 4:close + 7]
+        if close < 2 or cmd in self.sentences or nmea_string[close + 7:close + 8] != ',':
+            return None
+        ts = nmea_string[1:close]
+        if nmea_string[0] != '[' or not (ts.isdecimal() and ts.isascii() and cmd.isalpha() and cmd.isascii()):
+            return None
+        return int(ts)
+
+    def coordinate(self, convert, value, hemisphere):
+        if self.defer_coordinates:
+            return (value, hemisphere)
+        return convert(value, hemisphere)
+
     def handler_dafault(self, cmd, *args):
         logger.warning('unknown command [%s] %s', cmd, args)
 
@@ -199,15 +663,16 @@ class NMEA(object):
                 'RMC_status': status,
             }
 
-        return {
-            'RMC_fix_datetime': nmea_datetime(date, hhmmss),
+        return LazyMessage({
             'RMC_status': status,
-            'RMC_lat': lat(latitude, ns),
-            'RMC_lng': lng(longitude, ew),
             'RMC_speed': spd,
             'RMC_angle': angle,
-            'RMC_magnetic_variation': ' '.join((mv, mvE))
-        }
+        }, {
+            'RMC_fix_datetime': (nmea_datetime, (date, hhmmss)),
+            'RMC_lat': (self.coordinate, (lat, latitude, ns)),
+            'RMC_lng': (self.coordinate, (lng, longitude, ew)),
+            'RMC_magnetic_variation': (' '.join, ((mv, mvE), )),
+        })
 
     def handler_VTG(self, cmd, *args):
         """
@@ -393,13 +858,14 @@ class NMEA(object):
                 'GLL_mode': mode,
             }
 
-        return {
-            'GLL_lat': lat(latitude, ns),
-            'GLL_lng': lng(longitude, ew),
+        return LazyMessage({
             'GLL_utc': utc,
             'GLL_valid': valid,
             'GLL_mode': mode,
-        }
+        }, {
+            'GLL_lat': (self.coordinate, (lat, latitude, ns)),
+            'GLL_lng': (self.coordinate, (lng, longitude, ew)),
+        })
 
     def handler_TXT(self, cmd, *args):
         """
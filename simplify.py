@@ -0,0 +1,128 @@
+#!/bin/python
+
+import heapq
+import math
+
+import logging
+logger = logging.getLogger(__name__)
+# logger.setLevel(logging.INFO)
+
+EARTH_RADIUS = 6371008.8  # m, mean radius
+METHODS = ('visvalingam', 'dp')
+
+
+def project(coordinates):
+    """[lng, lat] degrees -> (x, y) metres on a plane tangent at the first point (equirectangular, fine for a ride)"""
+    if not coordinates:
+        return []
+    lng0, lat0 = coordinates[0]
+    kx = math.radians(1) * EARTH_RADIUS * math.cos(math.radians(lat0))
+    ky = math.radians(1) * EARTH_RADIUS
+    return [((lng - lng0) * kx, (lat - lat0) * ky) for lng, lat in coordinates]
+
+
+def triangle_area(a, b, c):
+    return abs((b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])) / 2
+
+
+def segment_distance(p, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length2 = dx * dx + dy * dy
+    if not length2:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length2))
+    return math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy)
+
+
+def visvalingam(points, tolerance):
+    """
+    indexes of the points to keep: the point spanning the smallest triangle with its neighbours is dropped until
+    every remaining triangle is at least tolerance**2 m2 (a tolerance-wide detour over a tolerance-long base counts
+    as half of that); a heap with lazy deletion keeps it O(n log n)
+    """
+    n = len(points)
+    if n < 3:
+        return list(range(n))
+
+    threshold = tolerance * tolerance
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    area = [math.inf] * n
+    for i in range(1, n - 1):
+        area[i] = triangle_area(points[i - 1], points[i], points[i + 1])
+    heap = [(area[i], i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+
+    removed = [False] * n
+    while heap:
+        a, i = heapq.heappop(heap)
+        if removed[i] or a != area[i]:
+            continue
+        if a >= threshold:
+            break
+        removed[i] = True
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                # effective area never drops below the one just removed, as in the original algorithm
+                area[j] = max(a, triangle_area(points[prev[j]], points[j], points[nxt[j]]))
+                heapq.heappush(heap, (area[j], j))
+
+    return [i for i in range(n) if not removed[i]]
+
+
+def douglas_peucker(points, tolerance):
+    """indexes of the points to keep, no dropped point is further than tolerance m from the result; no recursion"""
+    n = len(points)
+    if n < 3:
+        return list(range(n))
+
+    keep = [False] * n
+    keep[0] = keep[n - 1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        a, b = points[start], points[end]
+        index, distance = None, tolerance
+        for i in range(start + 1, end):
+            d = segment_distance(points[i], a, b)
+            if d > distance:
+                index, distance = i, d
+        if index is not None:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [i for i in range(n) if keep[i]]
+
+
+class Simplifier(object):
+    """simplify(coordinates) for every track of an export, with totals for the reduction ratio"""
+
+    def __init__(self, tolerance, method='visvalingam'):
+        if method not in METHODS:
+            raise RuntimeError('unknown simplification method: {0}'.format(method))
+        self.tolerance = tolerance
+        self.method = method
+        self.points_in = 0
+        self.points_out = 0
+
+    def __call__(self, coordinates):
+        """[lng, lat] list (or iterable) -> simplified [lng, lat] list, first and last points are always kept"""
+        coordinates = list(coordinates)
+        points = project(coordinates)
+        if self.method == 'dp':
+            indexes = douglas_peucker(points, self.tolerance)
+        else:
+            indexes = visvalingam(points, self.tolerance)
+        self.points_in += len(coordinates)
+        self.points_out += len(indexes)
+        return [coordinates[i] for i in indexes]
+
+    def ratio(self):
+        return self.points_in / self.points_out if self.points_out else 1.0
+
+    def log(self):
+        logger.info('simplify (%s, %sm): %s -> %s points, x%.1f',
+                    self.method, self.tolerance, self.points_in, self.points_out, self.ratio())
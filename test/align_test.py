@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import pytest
+import array
+import math
+import random
+
+import align
+import tgf
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def impl(request, monkeypatch):
+    if request.param == 'numpy':
+        if align.numpy is None:
+            pytest.skip('numpy is not installed')
+    else:
+        monkeypatch.setattr(align, 'numpy', None)
+    return request.param
+
+
+def interpolate(gps_ts, lat, lng, ts, max_gap=align.MAX_GAP):
+    lat, lng = align.interpolate(array.array('q', gps_ts), array.array('d', lat), array.array('d', lng),
+                                 array.array('q', ts), max_gap)
+    return [None if math.isnan(v) else v for v in lat], [None if math.isnan(v) else v for v in lng]
+
+
+def test_interpolate_linear(impl):
+    lat, lng = interpolate([1000, 2000], [53.0, 54.0], [27.0, 26.0], [1000, 1250, 1500, 2000])
+    assert lat == pytest.approx([53.0, 53.25, 53.5, 54.0])
+    assert lng == pytest.approx([27.0, 26.75, 26.5, 26.0])
+
+
+def test_interpolate_gap(impl):
+    gps_ts = [0, 1000, 1000 + align.MAX_GAP + 1, 2000 + align.MAX_GAP + 1]
+    lat, lng = interpolate(gps_ts, [1.0, 2.0, 3.0, 4.0], [1.0, 2.0, 3.0, 4.0],
+                           [500, 1000, 3000, gps_ts[2], gps_ts[2] + 500])
+    # no position inside the gap, the fixes on both of its ends are still exact
+    assert lat == [pytest.approx(1.5), 2.0, None, 3.0, pytest.approx(3.5)]
+    assert lng[2] is None
+
+    lat, lng = interpolate([0, 100], [1.0, 2.0], [1.0, 2.0], [50], max_gap=99)
+    assert lat == [None]
+
+
+def test_interpolate_outside_track(impl):
+    lat, lng = interpolate([1000, 2000], [53.0, 54.0], [27.0, 26.0], [0, 999, 2001, 5000])
+    assert lat == [None] * 4 and lng == [None] * 4
+
+    assert interpolate([1000], [53.0], [27.0], [999, 1000, 1001]) == ([None, 53.0, None], [None, 27.0, None])
+    assert interpolate([], [], [], [1000]) == ([None], [None])
+    assert interpolate([1000, 2000], [53.0, 54.0], [27.0, 26.0], []) == ([], [])
+
+
+def test_interpolate_numpy_matches_python(monkeypatch):
+    if align.numpy is None:
+        pytest.skip('numpy is not installed')
+    rng = random.Random(13)
+    for _ in range(50):
+        gps_ts = array.array('q', sorted(rng.sample(range(0, 60000, 250), rng.randrange(0, 40))))
+        lat = array.array('d', [rng.uniform(-90, 90) for _ in gps_ts])
+        lng = array.array('d', [rng.uniform(-180, 180) for _ in gps_ts])
+        ts = array.array('q', sorted(rng.randrange(-1000, 61000) for _ in range(rng.randrange(0, 200))))
+        vectorized = align.interpolate(gps_ts, lat, lng, ts, 2000)
+        with monkeypatch.context() as m:
+            m.setattr(align, 'numpy', None)
+            expected = align.interpolate(gps_ts, lat, lng, ts, 2000)
+        for v, e in zip(vectorized, expected):
+            assert [None if math.isnan(x) else pytest.approx(x) for x in e] == \
+                [None if math.isnan(x) else x for x in v]
+
+
+def samples(*rows):
+    return tgf.Samples([array.array(typecode, column) for (name, typecode), column in zip(tgf.COLUMNS, zip(*rows))])
+
+
+def test_accel_at():
+    s = samples((900, 1, 2, 2), (1000, 3, 4, 0), (1400, 0, 0, 10), (5000, 1, 1, 1))
+    nearest, peak = align.accel_at([1000, 1300, 3000, 5000, 9000], s)
+    assert nearest == [(3, 4, 0), (0, 0, 10), None, (1, 1, 1), None]
+    assert peak[:2] == [10.0, 10.0] and peak[3] == pytest.approx(math.sqrt(3))
+    assert math.isnan(peak[2]) and math.isnan(peak[4])
+
+
+def test_accel_at_empty():
+    nearest, peak = align.accel_at([1000, 2000], tgf.Samples())
+    assert nearest == [None, None] and all(math.isnan(p) for p in peak)
+    assert align.accel_at([], samples((1000, 1, 1, 1))) == ([], [])
+    nearest, peak = align.accel_at([1000], samples((1000, 1, 1, 1)), window=0)
+    assert nearest == [(1, 1, 1)]
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+import pytest
+import io
+import os
+import shutil
+
+import blackvue
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def copy_examples(dst, *names):
+    os.makedirs(dst, exist_ok=True)
+    for name in names:
+        shutil.copy(os.path.join(EXAMPLES, name), os.path.join(dst, name))
+    return dst
+
+
+@pytest.mark.parametrize("reader", [None, 'mmap'])
+def test_checksum_line_numbers_with_stray_cr(tmp_path, reader):
+    lines = open(os.path.join(EXAMPLES, '20170708_221449_N.gps'), 'rb').read().split(b'\n')
+    lines[0] = lines[0][:20] + b'\r' + lines[0][20:]
+    assert lines[20].startswith(b'[1499552091950]$GPVTG,62.87,')
+    lines[20] = lines[20].replace(b'VTG,', b'VTG,9')
+    filepath = tmp_path / '20170708_221449_N.gps'
+    filepath.write_bytes(b'\n'.join(lines))
+
+    options = {'checksum': 'strict'}
+    if reader:
+        options['reader'] = reader
+    records = blackvue.parse_file(str(filepath), options)
+
+    # the corrupted VTG is dropped, the good sentences around it are kept
+    assert 'VTG_sog' not in records[1499552091950]
+    assert 'RMC_lat' in records[1499552091950]
+    assert 'VTG_sog' in records[1499552092950]
+
+
+def incremental_args(src, dst):
+    os.makedirs(dst, exist_ok=True)
+    return {'src-dir': str(src), 'dst-dir': str(dst), 'nmea': True, 'incremental': True}
+
+
+def test_incremental_without_records(tmp_path):
+    args = incremental_args(copy_examples(str(tmp_path / 'src'), '20170709_080522_P.gps'), tmp_path / 'dst')
+
+    assert blackvue.process_gps_incremental(args) == []
+    manifest = blackvue.load_manifest(args['dst-dir'])
+    assert len(manifest['files']) == 1
+    assert sorted(os.listdir(args['dst-dir'])) == [blackvue.MANIFEST_FILENAME]
+    # the file is known now, nothing to do on the next run
+    assert blackvue.process_gps_incremental(args) == []
+
+
+def test_watch_survives_failed_run(tmp_path, monkeypatch):
+    class Stop(Exception):
+        pass
+
+    runs = []
+
+    def process_gps_incremental(args, file_cache=None):
+        runs.append(args)
+        if len(runs) == 1:
+            raise OSError('card removed')
+
+    def sleep(interval):
+        if len(runs) == 2:
+            raise Stop()
+
+    monkeypatch.setattr(blackvue, 'process_gps_incremental', process_gps_incremental)
+    monkeypatch.setattr(blackvue.time, 'sleep', sleep)
+    with pytest.raises(Stop):
+        blackvue.watch_gps(dict(incremental_args(tmp_path, tmp_path), **{'watch-interval': 0}))
+    assert len(runs) == 2
+
+
+def read_outputs(dst):
+    return {name: open(os.path.join(dst, name)).read() for name in os.listdir(dst)
+            if name != blackvue.MANIFEST_FILENAME}
+
+
+@pytest.mark.parametrize("batches", [
+    # an event file synced after the normal recordings it overlaps
+    [['20170708_221449_N.gps', '20170708_221831_N.gps', '20170708_222918_N.gps'], ['20170708_221530_E.gps']],
+    # one file per run, newest first
+    [[name] for name in ['20170708_223219_N.gps', '20170708_222918_N.gps', '20170708_221831_N.gps',
+                         '20170708_221530_E.gps', '20170708_221449_N.gps']],
+])
+def test_incremental_matches_full_run(tmp_path, batches):
+    src = str(tmp_path / 'src')
+    args = dict(incremental_args(src, tmp_path / 'dst'), geojson=True)
+    for names in batches:
+        copy_examples(src, *names)
+        assert blackvue.process_gps_incremental(args)
+
+    full_args = dict(incremental_args(src, tmp_path / 'full'), geojson=True)
+    blackvue.process_gps_incremental(full_args)
+    outputs = read_outputs(args['dst-dir'])
+    assert outputs == read_outputs(full_args['dst-dir'])
+    assert 'track_20170708_221450_20170708_221919.nmea' in outputs
+    assert blackvue.load_manifest(args['dst-dir'])['tracks'] == blackvue.load_manifest(full_args['dst-dir'])['tracks']
+
+
+@pytest.mark.parametrize("window, clip, expected", [
+    # a 3 minute recording started at 23:59:30 on the 8th runs until 00:02:30 on the 9th
+    (('2017-07-09T00:02:00', None), 180000, ['20170708', '2017-07-09', 'Record']),
+    (('2017-07-09T00:02:00', None), 0, ['2017-07-09', 'Record']),
+    ((None, '2017-07-08T23:58:00'), 180000, ['20170708', 'Record']),
+    (('2017-07-10T00:05:00', None), 180000, ['Record']),
+])
+def test_prune_dirs(window, clip, expected):
+    dirs = ['20170708', '2017-07-09', 'Record']
+    blackvue.prune_dirs(dirs, tuple(blackvue.parse_time(t) if t else None for t in window), clip)
+    assert dirs == expected
+
+
+def test_find_input_files_window(tmp_path):
+    copy_examples(str(tmp_path / '20170708'), '20170708_221449_N.gps')
+    copy_examples(str(tmp_path / '20170709'), '20170709_080018_N.gps')
+
+    window = (blackvue.parse_time('2017-07-09T08:10:00'), None)
+    files = blackvue.find_input_files(str(tmp_path), window=window, clip=180000)
+    assert [os.path.basename(f) for f in files] == ['20170709_080018_N.gps']
+    assert len(blackvue.find_input_files(str(tmp_path))) == 2
+
+
+def test_merge_columns_matches_records():
+    input_files = sorted(os.path.join(EXAMPLES, name) for name in os.listdir(EXAMPLES) if name.endswith('.gps'))
+    options = blackvue.parser_options({'columnar': True})
+
+    t = blackvue.merge_columns(blackvue.load_files(input_files, options, 1))
+    nmea_records = blackvue.merge_records(blackvue.load_files(input_files, options, 1))
+    expected = blackvue.to_track(nmea_records[ts] for ts in sorted(nmea_records.keys()))
+    assert list(t.records()) == list(expected.records())
+    speeds = [r['RMC_speed'] for r in t.records() if 'RMC_speed' in r]
+    assert '0.030' in speeds
+
+
+def test_incremental_simplify_logged_once(tmp_path, caplog):
+    src = copy_examples(str(tmp_path / 'src'), '20170708_221449_N.gps', '20170709_080018_N.gps')
+    args = dict(incremental_args(src, tmp_path / 'dst'), geojson=True, simplify=5,
+                **{'simplify-method': 'dp'})
+    caplog.set_level('INFO')
+    outputs = blackvue.process_gps_incremental(args)
+    assert len([name for name in outputs if name.endswith('.geojson')]) == 2
+    assert len([r for r in caplog.records if r.getMessage().startswith('simplify (dp, 5m)')]) == 1
+
+
+@pytest.fixture
+def no_stdin(monkeypatch):
+    """collect_input reads the files of src-dir, not the stdin of the test runner"""
+    monkeypatch.setattr(blackvue.select, 'select', lambda *a: ([], [], []))
+
+
+def test_stream_input_matches_process_input(no_stdin):
+    args = {'src-dir': EXAMPLES}
+    records = blackvue.process_input(args)
+    # 221530_E overlaps 221449_N, the merge has to interleave the files and join equal timestamps
+    assert list(blackvue.stream_input(args)) == records
+
+    names = ['20170708_221831_N.gps', '20170708_221530_E.gps', '20170708_221449_N.gps']
+    input_files = [os.path.join(EXAMPLES, name) for name in names]
+    nmea_records = blackvue.merge_records(blackvue.load_files(input_files, blackvue.parser_options(args), 1))
+    streamed = blackvue.merge_messages(blackvue.iter_file_messages(filepath)
+                                       for filepath in sorted(input_files, key=os.path.basename))
+    assert list(streamed) == [nmea_records[ts] for ts in sorted(nmea_records.keys())]
+
+
+@pytest.mark.parametrize("output", ['nmea', 'geojson', 'bin'])
+def test_stream_output_matches(no_stdin, capsysbinary, output):
+    args = {'src-dir': EXAMPLES, output: True}
+    blackvue.write_gps(args)
+    expected = capsysbinary.readouterr().out
+    blackvue.write_gps(dict(args, stream=True))
+    assert capsysbinary.readouterr().out == expected
+
+
+@pytest.mark.parametrize("line, expected", [
+    (b'[1499552090960]$GPRMC,191450.00,A,5357.14375,N*56', (1499552090960, b'$GPRMC')),
+    (b'[1499552090960]$GNVTG,,T,,M,0.151,N*2C', (1499552090960, b'$GNVTG')),
+    (b'[1499552090960]$GPGSV,3,2,12,05,17,065*7A', (1499552090960, b'$GPGSV,2')),
+    (b'[1499552090960]$GPGSA,A,3,05,13*0C', (1499552090960, b'$GPGSA,A,3,05,13*0C')),
+    (b'[1499552090960]', (1499552090960, b'')),
+    (b'$GPRMC,191450.00,A*56', None),
+    (b'[]$GPRMC,191450.00,A*56', None),
+    (b'[14995x2090960]$GPRMC*56', None),
+    (b'', None),
+])
+def test_line_key(line, expected):
+    assert blackvue.line_key(line) == expected
+
+
+def test_merge_day(tmp_path):
+    first = tmp_path / '20170708_221449_N.gps'
+    first.write_bytes(b'\n'.join([
+        b'[1000]$GPRMC,1*00',
+        b'[1000]$GPGSV,2,1,08*00',
+        b'[1000]$GPGSV,2,2,08*00',
+        b'[2000]$GPRMC,2*00',
+        b'$GPTXT,no timestamp*00',
+        b'',
+        b'[3000]$GPRMC,3*00',
+    ]) + b'\n')
+    # an event recording overlapping the end of the first file
+    second = tmp_path / '20170708_221530_E.gps'
+    second.write_bytes(b'\n'.join([
+        b'[2000]$GPRMC,2*00',
+        b'[2000]$GPVTG,2*00',
+        b'[3000]$GPRMC,3*00',
+        b'[3000]$GPGSA,A,3*00',
+        b'[4000]$GPRMC,4*00',
+    ]) + b'\n')
+
+    f = io.BytesIO()
+    stats = {'lines': 0, 'duplicates': 0, 'dropped': 0}
+    blackvue.merge_day([str(first), str(second)], f, stats)
+    assert f.getvalue().split(b'\n\n') == [
+        b'[1000]$GPRMC,1*00',
+        b'[1000]$GPGSV,2,1,08*00',
+        b'[1000]$GPGSV,2,2,08*00',
+        b'[2000]$GPRMC,2*00',
+        b'[2000]$GPVTG,2*00',
+        b'[3000]$GPRMC,3*00',
+        b'[3000]$GPGSA,A,3*00',
+        b'[4000]$GPRMC,4*00',
+        b'',
+    ]
+    assert stats == {'lines': 8, 'duplicates': 2, 'dropped': 1}
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import pytest
+import os
+import shutil
+
+import blackvue
+import cache
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+@pytest.fixture
+def gps_file(tmp_path):
+    filepath = str(tmp_path / '20170708_221449_N.gps')
+    shutil.copy(os.path.join(EXAMPLES, '20170708_221449_N.gps'), filepath)
+    return filepath
+
+
+@pytest.mark.parametrize("use_hash", [False, True])
+def test_round_trip(tmp_path, gps_file, use_hash):
+    options = blackvue.nmea_options(blackvue.parser_options({'geojson': True}))
+    records = blackvue.parse_file(gps_file, options)
+
+    file_cache = cache.FileCache(str(tmp_path / 'cache'), use_hash=use_hash)
+    assert file_cache.get(gps_file, options) is None
+    file_cache.put(gps_file, options, records)
+    assert file_cache.get(gps_file, options) == records
+    # other parser options are another entry
+    assert file_cache.get(gps_file, {}) is None
+    assert file_cache.span(gps_file) == (min(records), max(records))
+    file_cache.close()
+
+    file_cache = cache.FileCache(str(tmp_path / 'cache'), use_hash=use_hash)
+    assert file_cache.get(gps_file, options) == records
+    assert (file_cache.hits, file_cache.misses) == (1, 0)
+    file_cache.close()
+
+
+def test_changed_file(tmp_path, gps_file):
+    file_cache = cache.FileCache(str(tmp_path / 'cache'))
+    file_cache.put(gps_file, {}, blackvue.parse_file(gps_file))
+
+    with open(gps_file, mode='a') as f:
+        f.write('[1499552400000]$GPGLL,5357.14375,N,02740.86226,E,191450.00,A,A*6B\n')
+    assert file_cache.get(gps_file, {}) is None
+    assert file_cache.span(gps_file) is None
+    file_cache.close()
+
+
+def test_load_files(tmp_path, gps_file):
+    file_cache = cache.FileCache(str(tmp_path / 'cache'))
+    options = blackvue.parser_options({})
+    first = list(blackvue.load_files([gps_file], options, 1, file_cache))
+    second = list(blackvue.load_files([gps_file], options, 1, file_cache))
+    assert first == second == [blackvue.parse_file(gps_file, options)]
+    assert (file_cache.hits, file_cache.misses) == (1, 1)
+    file_cache.close()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import pytest
+import os
+import shutil
+
+import blackvue
+import geoindex
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+@pytest.fixture
+def index_args(tmp_path):
+    src = tmp_path / 'Record'
+    src.mkdir()
+    for name in ('20170708_221449_N.gps', '20170709_080018_N.gps'):
+        shutil.copy(os.path.join(EXAMPLES, name), str(src / name))
+    return {'src-dir': str(src), 'index': str(tmp_path / 'index.sqlite')}
+
+
+def test_pack():
+    points = [(1499552090960, 53.95, 27.68), (1499552091950, -53.95, -27.68)]
+    assert list(geoindex.unpack(geoindex.pack(points))) == points
+
+
+def test_distance():
+    assert geoindex.distance(53.95, 27.68, 53.95, 27.68) == 0
+    assert geoindex.distance(0, 0, 1, 0) == pytest.approx(111195, rel=1e-3)
+
+
+def test_query(index_args):
+    blackvue.build_index(index_args)
+    records = blackvue.parse_file(os.path.join(index_args['src-dir'], '20170708_221449_N.gps'))
+    lat, lng = next((r['RMC_lat'], r['RMC_lng']) for ts, r in sorted(records.items()) if r.get('RMC_lat'))
+
+    index = geoindex.GeoIndex(index_args['index'])
+    try:
+        assert index.stats()[0] == 2
+        assert all(index.is_current(os.path.join(index_args['src-dir'], f)) for f in os.listdir(index_args['src-dir']))
+
+        found = index.query_near(lat, lng, 50)
+        assert '20170708_221449_N' in [item['recording'] for item in found]
+        item = found[0]
+        assert item['points'] > 0 and item['first_ts'] <= item['last_ts']
+
+        assert index.query(lat + 1, lng + 1, lat + 2, lng + 2) == []
+    finally:
+        index.close()
+
+
+def test_build_index_skips_current(index_args, monkeypatch):
+    blackvue.build_index(index_args)
+
+    parsed = []
+    parse_file = blackvue.parse_file
+    monkeypatch.setattr(blackvue, 'parse_file', lambda filepath, options=None: parsed.append(filepath) or
+                        parse_file(filepath, options))
+    blackvue.build_index(index_args)
+    assert parsed == []
+
+    filepath = os.path.join(index_args['src-dir'], '20170709_080018_N.gps')
+    with open(filepath, mode='a') as f:
+        f.write('\n')
+    blackvue.build_index(index_args)
+    assert parsed == [filepath]
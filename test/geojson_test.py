@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import pytest
+import io
+import json
+import random
+
+import blackvue
+import geojson
+
+rng = random.Random(10)
+LINES = [
+    [[27.6810377, 53.9523958], [27.6811, -53.95], None, [-0.5, 1e-07]],
+    [],
+    [[27.0, 53.0]],
+    # more points than one write of the writer
+    [[rng.uniform(-180, 180), rng.uniform(-90, 90)] for _ in range(10000)],
+]
+
+
+def write(lines, **kwargs):
+    f = io.StringIO()
+    with geojson.GeoJsonWriter(f, **kwargs) as gj:
+        for coordinates in lines:
+            gj.add_line_string(iter(coordinates))
+    return f.getvalue()
+
+
+def collection_dump(lines):
+    gj = geojson.GeoJsonFeatureCollection()
+    for coordinates in lines:
+        ls = geojson.LineString()
+        for p in coordinates:
+            ls.add_point(p)
+        gj.add_feature(ls)
+    return gj.dump()
+
+
+@pytest.mark.parametrize("lines", [LINES, LINES[:1], LINES[1:2], [], LINES[3:]])
+def test_matches_collection_dump(lines):
+    assert write(lines) == collection_dump(lines)
+
+
+def test_matches_geojson_dump():
+    gj = geojson.GeoJson()
+    for p in LINES[0]:
+        if p:
+            gj.add_point(p)
+    assert write(LINES[:1], properties={'stroke': 'red'}) == gj.dump()
+
+
+def test_compact():
+    text = write(LINES, indent=None)
+    assert '\n' not in text and ': ' not in text
+    assert json.loads(text) == json.loads(collection_dump(LINES))
+    assert write([], indent=None) == '{"features":[],"type":"FeatureCollection"}'
+
+
+def test_ndjson():
+    text = write(LINES, ndjson=True)
+    lines = text.split('\n')
+    assert lines[-1] == ''
+    features = [json.loads(line) for line in lines[:-1]]
+    assert features == json.loads(collection_dump(LINES))['features']
+    assert write([], ndjson=True) == ''
+
+
+@pytest.mark.parametrize("options", [{}, {'compact': True}, {'ndjson': True}])
+def test_out_geojson_options(options, capsys):
+    series = [[{'timestamp': i, 'RMC_lng': p[0], 'RMC_lat': p[1]} for i, p in enumerate(coordinates) if p]
+              for coordinates in LINES[:3]]
+    blackvue.out_geojson(options, series)
+    out = capsys.readouterr().out
+    if options.get('ndjson'):
+        out = '{{"features":[{0}],"type":"FeatureCollection"}}'.format(','.join(out.splitlines()))
+    assert json.loads(out) == json.loads(collection_dump(LINES[:3]))
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+import pytest
+import calendar
+import datetime
+import glob
+import math
+import os
+import random
+
+import nmea
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def line_checksum_errors(data):
+    """per-line reference for checksum_errors"""
+    errors = set()
+    for idx, line in enumerate(data.split(b'\n'), 1):
+        computed, transmitted = nmea.checksum(line.decode('latin-1'))
+        if computed is not None and computed != transmitted:
+            errors.add(idx)
+    return errors
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def checksum_impl(request, monkeypatch):
+    if request.param == 'numpy':
+        if nmea.numpy is None:
+            pytest.skip('numpy is not installed')
+    else:
+        monkeypatch.setattr(nmea, 'numpy', None)
+    return request.param
+
+
+@pytest.mark.parametrize("data, expected", [
+    (b'', set()),
+    (b'\n', set()),
+    (b'[1]$GPVTG,,T,,M,0.151,N,0.280,K,A*2C\n', set()),
+    (b'[1]$GPVTG,,T,,M,0.151,N,0.280,K,A*2c\n', set()),
+    (b'[1]$GPVTG,,T,,M,0.151,N,0.280,K,A*2D\n', {1}),
+    (b'[1]$GPVTG,,T,,M,0.151,N,0.280,K,A*2\n', {1}),
+    (b'[1]$GPVTG,,T,,M,0.151,N,0.280,K,A*zz', {1}),
+    (b'no checksum here\n[1]$GPVTG,,T,,M,0.151,N,0.280,K,A*2D', {2}),
+    (b'*$\n$*00\n$a*61*\n$a*61\r', {3}),
+    (b'$' + b'x' * 301 + b'*00\n$a*61', {1}),
+])
+def test_checksum_errors(checksum_impl, data, expected):
+    assert nmea.checksum_errors(data) == expected
+
+
+def test_checksum_errors_examples(checksum_impl):
+    data = b''.join(open(filename, 'rb').read() for filename in sorted(glob.glob(os.path.join(EXAMPLES, '*.gps'))))
+    corrupted = bytearray(data)
+    for pos in range(1000, len(corrupted), 7919):
+        corrupted[pos] ^= 1
+    for data in (data, bytes(corrupted)):
+        assert nmea.checksum_errors(data) == line_checksum_errors(data)
+
+
+def strptime_datetime(fix_date, fix_time):
+    """the decoder nmea_datetime replaced"""
+    dt = datetime.datetime.strptime(' '.join((fix_date, fix_time, )), '%d%m%y %H%M%S.%f')
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+@pytest.mark.parametrize("year, month, day", [
+    (1970, 1, 1), (1969, 12, 31), (2000, 2, 29), (2004, 2, 29), (1900, 2, 28), (1900, 3, 1), (2100, 3, 1),
+    (1999, 12, 31), (2000, 1, 1), (2068, 12, 31), (1, 1, 1), (9999, 12, 31),
+])
+def test_days_from_civil(year, month, day):
+    days = datetime.date(year, month, day).toordinal() - datetime.date(1970, 1, 1).toordinal()
+    assert nmea.days_from_civil(year, month, day) == days
+    assert nmea.civil_from_days(days) == (year, month, day)
+
+
+@pytest.mark.parametrize("fix_date, fix_time", [
+    ('090717', '055554.00'),
+    # leap days, 2000 is a leap year (divisible by 400)
+    ('290200', '120000.00'),
+    ('290204', '235959.99'),
+    # century rollover of the two-digit year, 69-99 are 19xx as with %y
+    ('311299', '235959.99'),
+    ('010100', '000000.00'),
+    ('311268', '235959.00'),
+    ('010169', '000000.00'),
+    # fractions of every length %f takes
+    ('090717', '055554.0'),
+    ('090717', '055554.05'),
+    ('090717', '055554.123'),
+    ('090717', '055554.1234'),
+    ('090717', '055554.123456'),
+])
+def test_nmea_datetime(fix_date, fix_time):
+    expected = strptime_datetime(fix_date, fix_time)
+    assert nmea.nmea_datetime(fix_date, fix_time) == expected
+
+    dt = datetime.datetime.strptime(expected, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=datetime.timezone.utc)
+    assert nmea.fix_second(fix_date, fix_time[:6]) == calendar.timegm(dt.timetuple())
+    assert nmea.fix_ms(fix_date, fix_time) == calendar.timegm(dt.timetuple()) * 1000 + dt.microsecond // 1000
+
+
+@pytest.mark.parametrize("fix_date, fix_time", [
+    # invalid dates and times, strptime rejects them too
+    ('290201', '120000.00'),
+    ('300200', '120000.00'),
+    ('320117', '120000.00'),
+    ('310417', '120000.00'),
+    ('000117', '120000.00'),
+    ('011317', '120000.00'),
+    ('010017', '120000.00'),
+    ('090717', '240000.00'),
+    ('090717', '056000.00'),
+    ('090717', '055560.00'),
+    ('090717', '055554.1234567'),
+    ('090717', '055554'),
+    ('090717', '055554.'),
+    ('', '055554.00'),
+])
+def test_nmea_datetime_invalid(fix_date, fix_time):
+    with pytest.raises(ValueError):
+        strptime_datetime(fix_date, fix_time)
+    with pytest.raises(ValueError):
+        nmea.nmea_datetime(fix_date, fix_time)
+
+
+@pytest.mark.parametrize("fix_date, fix_time", [
+    # fields are fixed width: shorter or space-padded fields, which strptime read as single digits, are rejected
+    ('1392', '023332.058'),
+    ('090717', ' 6211.9690'),
+    ('9717', '055554.00'),
+    ('090717', '55554.00'),
+    ('0907170', '055554.00'),
+    ('09 717', '055554.00'),
+    ('090717', '05555４.00'),
+])
+def test_nmea_datetime_malformed(fix_date, fix_time):
+    with pytest.raises(ValueError):
+        nmea.nmea_datetime(fix_date, fix_time)
+
+
+def test_nmea_datetime_matches_strptime():
+    rng = random.Random(19)
+    for _ in range(20000):
+        fix_date = '{0:02d}{1:02d}{2:02d}'.format(rng.randrange(40), rng.randrange(15), rng.randrange(100))
+        fix_time = '{0:02d}{1:02d}{2:02d}.{3}'.format(rng.randrange(26), rng.randrange(62), rng.randrange(62),
+                                                       str(rng.randrange(10 ** 7)).zfill(rng.randrange(1, 8)))
+        try:
+            expected = strptime_datetime(fix_date, fix_time)
+        except ValueError:
+            expected = None
+        try:
+            result = nmea.nmea_datetime(fix_date, fix_time)
+        except ValueError:
+            result = None
+        assert result == expected, (fix_date, fix_time)
+
+
+RMC_MALFORMED_DATE = '[1499552090960]$GPRMC,191450.00,A,5357.14375,N,02740.86226,E,7.525,62.67,1392,,,A*56'
+
+
+def test_rmc_malformed_date():
+    # the whole sentence is rejected when the fix time is decoded ...
+    with pytest.raises(nmea.ProcessMessageException):
+        nmea.NMEA().process_message(RMC_MALFORMED_DATE)
+    # ... and does not matter when it is not asked for
+    ts, msg = nmea.NMEA(fields=('RMC_lat', )).process_message(RMC_MALFORMED_DATE)
+    assert msg == {'RMC_lat': pytest.approx(53.9523958)}
+
+
+RMC_SOUTH_WEST = '[1499552090960]$GPRMC,191450.00,A,5357.14375,S,02740.86226,W,7.525,62.67,080717,,,A*56'
+
+
+@pytest.mark.parametrize("defer_coordinates", [False, True])
+def test_rmc_south_west(defer_coordinates):
+    ts, msg = nmea.NMEA(defer_coordinates=defer_coordinates).process_message(RMC_SOUTH_WEST)
+    record = dict(msg, timestamp=ts)
+    if defer_coordinates:
+        assert record['RMC_lat'] == ('5357.14375', 'S')
+        nmea.convert_coordinates([record])
+    assert record['RMC_lat'] == pytest.approx(-53.9523958)
+    assert record['RMC_lng'] == pytest.approx(-27.6810377)
+    assert (nmea.lat('5357.14375', 'N'), nmea.lng('02740.86226', 'E')) == (-record['RMC_lat'], -record['RMC_lng'])
+
+
+def test_deferred_malformed_coordinate(caplog):
+    parser = nmea.NMEA(defer_coordinates=True)
+    records = []
+    for line in ['[1499552090960]$GPGLL,53x7.14375,N,02740.86226,E,191450.00,A,A*6B',
+                 '[1499552091950]$GPGLL,5357.14375,N,02740.86226,E,191451.00,A,A*6A']:
+        ts, msg = parser.process_message(line)
+        records.append(dict(msg, timestamp=ts))
+
+    nmea.convert_coordinates(records)
+    # the sentence with the malformed latitude loses all its fields, the other one is converted
+    assert records[0] == {'timestamp': 1499552090960}
+    assert records[1]['GLL_lat'] == pytest.approx(53.9523958)
+    assert 'invalid coordinate GLL_lat' in caplog.text
+
+
+@pytest.mark.parametrize("values, hemispheres", [
+    ([], []),
+    (['5357.14375', '02740.86226', '0', '0000.00001', '9000.0'], ['N', 'S', 'E', 'W', 'N']),
+    (['5357.14375', '', 'abc', '53.57.1', 'nan', 'inf'], ['S', 'N', 'W', 'N', 'S', 'E']),
+    ([''], ['N']),
+])
+def test_dm2d_batch(values, hemispheres, monkeypatch):
+    if nmea.numpy is None:
+        pytest.skip('numpy is not installed')
+    vectorized = nmea.dm2d_batch(values, hemispheres)
+    monkeypatch.setattr(nmea, 'numpy', None)
+    assert vectorized.tobytes() == nmea.dm2d_batch(values, hemispheres).tobytes()
+
+    for value, hemisphere, result in zip(values, hemispheres, vectorized):
+        try:
+            expected = (nmea.lng if hemisphere in ('E', 'W') else nmea.lat)(value, hemisphere)
+        except RuntimeError:
+            expected = None
+        if expected is None or math.isnan(expected):
+            assert math.isnan(result)
+        else:
+            assert result == expected
+
+
+RMC = '[1499552090960]$GPRMC,191450.00,A,5357.14375,N,02740.86226,E,7.525,62.67,080717,,,A*56'
+
+
+def counting(calls, function):
+    def decode(*args):
+        calls.append(args)
+        return function(*args)
+    return decode
+
+
+def test_lazy_message():
+    calls = []
+    msg = nmea.LazyMessage({'a': 1}, {'b': (counting(calls, str.upper), ('x', )), 'a': (counting(calls, int), ('2', ))})
+    assert calls == []
+    assert len(msg) == 2 and list(msg) == ['a', 'b'] and 'b' in msg
+    # a ready value is not decoded again, a pending one once on its first access
+    assert msg['a'] == 1 and calls == []
+    assert msg['b'] == 'X' and msg['b'] == 'X' and calls == [('x', )]
+    assert len(msg) == 2 and list(msg) == ['a', 'b']
+    assert dict(msg) == {'a': 1, 'b': 'X'}
+    with pytest.raises(KeyError):
+        msg['c']
+
+
+def test_lazy_rmc(monkeypatch):
+    calls = []
+    monkeypatch.setattr(nmea, 'nmea_datetime', counting(calls, nmea.nmea_datetime))
+    parser = nmea.NMEA()
+    ts, args = nmea.split_message(RMC)[::2]
+    msg = parser.handler_RMC('RMC', *args.split(','))
+    assert isinstance(msg, nmea.LazyMessage) and calls == []
+
+    eager = parser.process_message(RMC)[1]
+    assert type(eager) is dict and len(calls) == 1
+    assert len(msg) == len(eager) and list(msg) == list(eager)
+    assert calls == [('080717', '191450.00')] and dict(msg) == eager and len(calls) == 2
+
+
+def test_fields_projection(monkeypatch):
+    calls = []
+    monkeypatch.setattr(nmea, 'nmea_datetime', counting(calls, nmea.nmea_datetime))
+    ts, msg = nmea.NMEA(fields=('RMC_lng', 'RMC_status', 'VTG_sog')).process_message(RMC)
+    assert ts == 1499552090960
+    assert msg == {'RMC_lng': pytest.approx(27.6810377), 'RMC_status': 'A'}
+    assert list(msg) == ['RMC_lng', 'RMC_status'] and calls == []
+
+    ts, msg = nmea.NMEA(fields=('RMC_fix_datetime', )).process_message(RMC)
+    assert msg == {'RMC_fix_datetime': '2017-07-08T19:14:50.000000Z'} and len(calls) == 1
+
+
+@pytest.mark.parametrize("fields", [None, ('RMC_lat', )])
+def test_invalid_checksum(fields):
+    line = RMC.replace('*56', '*57')
+    expected = nmea.NMEA(fields=fields).process_message(line)
+
+    with pytest.raises(nmea.ProcessMessageChecksumException) as e:
+        nmea.NMEA(checksum='strict', fields=fields).process_message(line)
+    assert (e.value.computed, e.value.transmitted, e.value.result) == (0x56, 0x57, None)
+
+    with pytest.raises(nmea.ProcessMessageChecksumException) as e:
+        nmea.NMEA(checksum='warn', fields=fields).process_message(line)
+    # the message of a 'warn' mismatch is decoded as usual, projection included, and is a plain dict
+    assert e.value.result == expected and type(e.value.result[1]) is dict
+    assert sorted(expected[1]) == sorted(fields or expected[1])
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import simplify
+
+METHODS = [simplify.visvalingam, simplify.douglas_peucker]
+
+# x, y in metres
+ZIGZAG = [(0, 0), (10, 3), (20, -2), (30, 4), (40, 0), (50, 1)]
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_endpoints_kept(method):
+    indexes = method(ZIGZAG, 1000)
+    assert indexes == [0, len(ZIGZAG) - 1]
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_collinear_point_removed(method):
+    assert method([(0, 0), (5, 5), (10, 10)], 1) == [0, 2]
+    # a detour wider than the tolerance stays
+    assert method([(0, 0), (5, 5), (10, 0), (20, 0)], 1) == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_tolerance_zero_keeps_every_point(method):
+    assert method(ZIGZAG, 0) == list(range(len(ZIGZAG)))
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("points", [[], [(0, 0)], [(0, 0), (1, 1)]])
+def test_short_lines(method, points):
+    assert method(points, 10) == list(range(len(points)))
+
+
+@pytest.mark.parametrize("method", simplify.METHODS)
+def test_simplifier_totals(method):
+    simplifier = simplify.Simplifier(5, method)
+    coordinates = [[27.6, 53.9], [27.6005, 53.9005], [27.601, 53.901]]
+    assert simplifier(coordinates) == [coordinates[0], coordinates[-1]]
+    assert simplifier(coordinates[:1]) == coordinates[:1]
+    assert (simplifier.points_in, simplifier.points_out) == (4, 3)
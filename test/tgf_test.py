@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import pytest
+import io
+import os
+
+import tgf
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def impl(request, monkeypatch):
+    if request.param == 'numpy':
+        if tgf.numpy is None:
+            pytest.skip('numpy is not installed')
+    else:
+        monkeypatch.setattr(tgf, 'numpy', None)
+    return request.param
+
+
+def pack(*rows):
+    return b''.join(tgf.RECORD.pack(*row) for row in rows)
+
+
+ROWS = [(0, 1, -2, 3), (100, -32768, 32767, 0), (4294967295, 10, 20, -30)]
+
+
+def test_decode(impl):
+    samples = tgf.decode(pack(*ROWS), 1499552089000)
+    assert list(samples.rows()) == [(1499552089000 + ts, x, y, z) for ts, x, y, z in ROWS]
+    assert [c.typecode for c in samples.columns] == [typecode for name, typecode in tgf.COLUMNS]
+    assert len(tgf.decode(b'')) == 0
+
+
+def test_decode_trailing_partial_record(impl, caplog):
+    samples = tgf.decode(pack(*ROWS[:2]) + pack(ROWS[2])[:5])
+    assert list(samples.rows()) == ROWS[:2]
+    assert '5 trailing bytes dropped' in caplog.text
+    assert len(tgf.decode(b'\x00' * (tgf.RECORD.size - 1))) == 0
+
+
+def test_sorted(impl):
+    # out of order, and a duplicate timestamp from an overlapping file: the first sample read wins
+    samples = tgf.decode(pack((300, 3, 3, 3), (100, 1, 1, 1), (200, 2, 2, 2)))
+    samples.extend(tgf.decode(pack((200, 9, 9, 9), (400, 4, 4, 4), (100, 9, 9, 9))))
+    result = samples.sorted()
+    assert list(result.rows()) == [(100, 1, 1, 1), (200, 2, 2, 2), (300, 3, 3, 3), (400, 4, 4, 4)]
+    assert len(samples) == 6
+    assert len(tgf.Samples().sorted()) == 0
+
+
+def test_read_files(impl):
+    filepaths = [os.path.join(EXAMPLES, name) for name in ('20170708_221449_N.3gf', '20170708_221530_E.3gf')]
+    samples = tgf.read_files(filepaths)
+    assert list(samples.timestamp) == sorted(set(samples.timestamp))
+    assert samples.timestamp[0] >= tgf.file_start_ts(filepaths[0])
+
+
+def test_write_csv():
+    samples = tgf.decode(pack(*ROWS[:2]), 1000)
+    f = io.StringIO()
+    tgf.write_csv(f, samples)
+    assert f.getvalue() == 'timestamp,x,y,z\n1000,1,-2,3\n1100,-32768,32767,0\n'
+
+    f = io.StringIO()
+    tgf.write_csv(f, samples, ([53.9, float('nan')], [27.6, float('nan')]))
+    assert f.getvalue() == 'timestamp,x,y,z,lat,lng\n1000,1,-2,3,53.9,27.6\n1100,-32768,32767,0,\n'
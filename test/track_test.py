@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import pytest
+import io
+import math
+
+import bintrack
+import track
+
+
+def rmc(ts, status='A', lat=53.9, lng=27.6, speed='0.010', angle='301.20'):
+    return {'timestamp': ts, 'RMC_status': status, 'RMC_lat': lat, 'RMC_lng': lng, 'RMC_speed': speed,
+            'RMC_angle': angle}
+
+
+@pytest.mark.parametrize("value", ['0.010', '301.20', '266.00', '7.525', '266', '', None])
+def test_records_keep_transmitted_strings(value):
+    t = track.Track.from_records([rmc(1, speed=value, angle=value)])
+    record = next(t.records())
+    if value:
+        assert record['RMC_speed'] == value and record['RMC_angle'] == value
+    else:
+        assert 'RMC_speed' not in record and 'RMC_angle' not in record
+
+
+def test_records_odd_strings_as_floats():
+    t = track.Track.from_records([rmc(1, speed='07.50', angle='1e2')])
+    assert t.speed_digits[0] == -1 and t.course_digits[0] == -1
+    record = next(t.records())
+    assert (record['RMC_speed'], record['RMC_angle']) == ('7.5', '100.0')
+
+
+def test_merge():
+    first = track.Track.from_records([rmc(1), rmc(3, speed='1.0'), rmc(5)])
+    second = track.Track.from_records([rmc(2), rmc(3, speed='2.00'), {'timestamp': 5}, rmc(6)])
+
+    t = track.Track.merge([first, second])
+    assert list(t.timestamp) == [1, 2, 3, 5, 6]
+    records = list(t.records())
+    # the later track wins, unless it has no RMC sentence for the timestamp
+    assert records[2]['RMC_speed'] == '2.00'
+    assert records[3] == next(first[2:].records())
+    assert len(track.Track.merge([])) == 0
+
+
+def test_bin_round_trip():
+    t = track.Track.from_records([rmc(1), rmc(2, status='V', lat=None, lng=None, speed='', angle='')])
+    f = io.BytesIO()
+    bintrack.write(f, t)
+    f.seek(0)
+    assert list(bintrack.read(f).records()) == list(t.records())
+
+
+def test_bin_v1():
+    t = track.Track.from_records([rmc(1, speed='0.030'), rmc(2)])
+    f = io.BytesIO()
+    f.write(bintrack.HEADER.pack(bintrack.MAGIC_V1, len(t)))
+    for column in t.columns[:bintrack.V1_COLUMNS]:
+        f.write(column.tobytes())
+    f.seek(0)
+
+    t1 = bintrack.read(f)
+    assert list(t1.timestamp) == [1, 2] and math.isclose(t1.speed[0], 0.03)
+    assert next(t1.records())['RMC_speed'] == '0.03'
@@ -0,0 +1,151 @@
+#!/bin/python
+
+import array
+import calendar
+import math
+import os
+import re
+import struct
+
+import logging
+logger = logging.getLogger(__name__)
+# logger.setLevel(logging.INFO)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# .3gf record: ms since the start of the recording (uint32), then the x, y, z axes (int16, raw sensor units),
+# all big-endian
+RECORD = struct.Struct('>Ihhh')
+NUMPY_RECORD = [('offset', '>u4'), ('x', '>i2'), ('y', '>i2'), ('z', '>i2')]
+
+# column name, array typecode
+COLUMNS = (
+    ('timestamp', 'q'),  # ms, same clock as the [ts] prefix of .gps lines
+    ('x', 'h'),
+    ('y', 'h'),
+    ('z', 'h'),
+)
+
+FILENAME_RE = re.compile(r'(\d{8})_(\d{6})')
+
+
+def file_start_ts(filepath):
+    """ms timestamp of the recording start from a YYYYMMDD_HHMMSS_*.3gf file name, None if there is none"""
+    m = FILENAME_RE.match(os.path.basename(filepath))
+    if not m:
+        return None
+    d, t = m.groups()
+    return calendar.timegm((int(d[:4]), int(d[4:6]), int(d[6:]), int(t[:2]), int(t[2:4]), int(t[4:]))) * 1000
+
+
+class Samples(object):
+    """accelerometer samples as parallel columns (array.array, one per COLUMNS entry), as track.Track for RMC points"""
+
+    def __init__(self, columns=None):
+        if columns is None:
+            columns = [array.array(typecode) for name, typecode in COLUMNS]
+        self.columns = columns
+        self.timestamp, self.x, self.y, self.z = columns
+
+    def extend(self, other):
+        for column, values in zip(self.columns, other.columns):
+            column.extend(values)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def rows(self):
+        return zip(*self.columns)
+
+    def sorted(self):
+        """a copy ordered by timestamp; later samples with an already seen timestamp (overlapping files) are dropped"""
+        if numpy is not None:
+            ts = numpy.frombuffer(self.timestamp, dtype='q')
+            order = numpy.argsort(ts, kind='stable')
+            first = numpy.ones(len(order), dtype=bool)
+            first[1:] = ts[order][1:] != ts[order][:-1]
+            keep = order[first]
+            return Samples([array.array(typecode, numpy.frombuffer(c, dtype=typecode)[keep].tobytes())
+                            for (name, typecode), c in zip(COLUMNS, self.columns)])
+
+        result = Samples()
+        last_ts = None
+        for i in sorted(range(len(self)), key=self.timestamp.__getitem__):
+            ts = self.timestamp[i]
+            if ts == last_ts:
+                continue
+            last_ts = ts
+            for column, values in zip(result.columns, self.columns):
+                column.append(values[i])
+        return result
+
+    def as_numpy(self):
+        """the columns as numpy arrays sharing memory with these samples (numpy is optional)"""
+        if numpy is None:
+            raise RuntimeError('numpy is not installed')
+        return {name: numpy.frombuffer(c, dtype=typecode) for (name, typecode), c in zip(COLUMNS, self.columns)}
+
+    def nbytes(self):
+        return sum(len(c) * c.itemsize for c in self.columns)
+
+
+def decode(data, start_ts=0):
+    """a whole .3gf file (bytes) -> Samples in one pass; a trailing partial record is dropped"""
+    extra = len(data) % RECORD.size
+    if extra:
+        logger.warning('3gf: %s trailing bytes dropped', extra)
+        data = memoryview(data)[:len(data) - extra]
+
+    if numpy is not None:
+        records = numpy.frombuffer(data, dtype=NUMPY_RECORD)
+        columns = [records['offset'].astype('q') + start_ts, records['x'], records['y'], records['z']]
+        return Samples([array.array(typecode, c.astype(typecode).tobytes())
+                        for (name, typecode), c in zip(COLUMNS, columns)])
+
+    if not len(data):
+        return Samples()
+    offsets, x, y, z = zip(*RECORD.iter_unpack(data))
+    return Samples([
+        array.array('q', [start_ts + offset for offset in offsets]),
+        array.array('h', x),
+        array.array('h', y),
+        array.array('h', z),
+    ])
+
+
+def read_file(filepath):
+    start_ts = file_start_ts(filepath)
+    if start_ts is None:
+        logger.warning('3gf: no start time in file name [%s], timestamps are offsets', filepath)
+        start_ts = 0
+    with open(filepath, mode='rb') as f:
+        return decode(f.read(), start_ts)
+
+
+def read_files(filepaths):
+    """samples of all files on one timeline (sorted, duplicates of overlapping recordings dropped)"""
+    samples = Samples()
+    for filepath in filepaths:
+        logger.debug('3gf: file [%s]', filepath)
+        samples.extend(read_file(filepath))
+    result = samples.sorted()
+    logger.info('3gf: %s files, %s samples (%s duplicates), %s bytes',
+                len(filepaths), len(result), len(samples) - len(result), result.nbytes())
+    return result
+
+
+def write_csv(f, samples, positions=None):
+    """csv of the samples; positions adds lat, lng columns (align.interpolate arrays, nan written as empty)"""
+    if positions is None:
+        f.write('timestamp,x,y,z\n')
+        f.writelines('{0},{1},{2},{3}\n'.format(*row) for row in samples.rows())
+        return
+
+    f.write('timestamp,x,y,z,lat,lng\n')
+    for row, lat, lng in zip(samples.rows(), *positions):
+        f.write('{0},{1},{2},{3},'.format(*row))
+        f.write('\n' if math.isnan(lat) else '{0!r},{1!r}\n'.format(lat, lng))
+
@@ -0,0 +1,188 @@
+#!/bin/python
+
+import array
+import heapq
+import itertools
+import math
+
+import logging
+logger = logging.getLogger(__name__)
+# logger.setLevel(logging.INFO)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NAN = float('nan')
+
+# column name, array typecode
+COLUMNS = (
+    ('timestamp', 'q'),  # ms, as in the [ts] prefix of a .gps line
+    ('lat', 'd'),  # RMC_lat, nan without a fix
+    ('lng', 'd'),  # RMC_lng, nan without a fix
+    ('speed', 'd'),  # RMC_speed, knots
+    ('course', 'd'),  # RMC_angle, degrees
+    ('status', 'B'),  # RMC_status as a byte: ord('A'), ord('V'), 0 if there was no RMC sentence
+    ('speed_digits', 'b'),  # decimals of RMC_speed as transmitted ('0.010' -> 3), -1 if unknown
+    ('course_digits', 'b'),  # decimals of RMC_angle
+)
+
+# index of the status column in columns and rows
+STATUS = [name for name, typecode in COLUMNS].index('status')
+
+# record keys from_records reads, the parser is asked for these only (nmea.NMEA fields)
+FIELDS = ('RMC_status', 'RMC_lat', 'RMC_lng', 'RMC_speed', 'RMC_angle')
+
+
+def _float(value):
+    if value is None or value == '':
+        return NAN
+    try:
+        return float(value)
+    except ValueError:
+        return NAN
+
+
+def _digits(value):
+    """decimals that give value back through _str, -1 when the string has another shape (leading zeros, ...)"""
+    if not isinstance(value, str):
+        return -1
+    digits = len(value) - value.index('.') - 1 if '.' in value else 0
+    if digits > 127 or _str(_float(value), digits) != value:
+        return -1
+    return digits
+
+
+def _str(value, digits=-1):
+    # RMC_speed/RMC_angle come out of nmea.NMEA as the raw NMEA strings, trailing zeros included
+    if math.isnan(value):
+        return ''
+    return repr(value) if digits < 0 else '{0:.{1}f}'.format(value, digits)
+
+
+class Track(object):
+    """
+    RMC points as parallel columns (array.array, one per COLUMNS entry) instead of one dict per timestamp
+
+    slicing (track[i:j], split) returns a Track over memoryviews of the same columns, nothing is copied; while such
+    a view exists the arrays are pinned and append raises BufferError, as for any exported buffer
+    """
+
+    def __init__(self, columns=None):
+        if columns is None:
+            columns = [array.array(typecode) for name, typecode in COLUMNS]
+        self.columns = columns
+        (
+            self.timestamp,
+            self.lat,
+            self.lng,
+            self.speed,
+            self.course,
+            self.status,
+            self.speed_digits,
+            self.course_digits,
+        ) = columns
+
+    @classmethod
+    def from_records(cls, records):
+        """build from process_input records (dicts with 'timestamp' and RMC_* keys); records may be a generator"""
+        t = cls()
+        for record in records:
+            status = record.get('RMC_status')
+            t.append(
+                record['timestamp'],
+                _float(record.get('RMC_lat')),
+                _float(record.get('RMC_lng')),
+                _float(record.get('RMC_speed')),
+                _float(record.get('RMC_angle')),
+                ord(status[0]) if status else 0,
+                _digits(record.get('RMC_speed')),
+                _digits(record.get('RMC_angle')),
+            )
+        return t
+
+    @classmethod
+    def merge(cls, tracks):
+        """
+        one track of tracks (each ordered by timestamp) as merge_records merges the records of the files: on equal
+        timestamps a later track wins; a point with an RMC sentence carries all RMC fields, so the whole point is
+        taken unless it has no RMC sentence (status 0)
+        """
+        t = cls()
+        points = heapq.merge(*[zip(other.timestamp, itertools.repeat(k), itertools.count())
+                               for k, other in enumerate(tracks)])
+        for ts, k, i in points:
+            row = [c[i] for c in tracks[k].columns]
+            if len(t) and t.timestamp[-1] == ts:
+                if row[STATUS]:
+                    for column, value in zip(t.columns, row):
+                        column[-1] = value
+                continue
+            t.append(*row)
+        return t
+
+    def append(self, timestamp, lat, lng, speed=NAN, course=NAN, status=0, speed_digits=-1, course_digits=-1):
+        self.timestamp.append(timestamp)
+        self.lat.append(lat)
+        self.lng.append(lng)
+        self.speed.append(speed)
+        self.course.append(course)
+        self.status.append(status)
+        self.speed_digits.append(speed_digits)
+        self.course_digits.append(course_digits)
+
+    def extend(self, other):
+        for column, values in zip(self.columns, other.columns):
+            column.extend(values)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('Track supports slices only, use records() for rows')
+        return Track([memoryview(c)[key] for c in self.columns])
+
+    def split(self, gap):
+        """zero-copy chunks wherever two consecutive timestamps are more than gap ms apart (as split_tracks)"""
+        start = 0
+        last_ts = None
+        for i, ts in enumerate(self.timestamp):
+            if last_ts and ts - last_ts > gap:
+                yield self[start:i]
+                start = i
+            last_ts = ts
+        if start < len(self):
+            yield self[start:]
+
+    def coordinates(self):
+        """[lng, lat] of every point with a position, as out_geojson adds them"""
+        for lng, lat in zip(self.lng, self.lat):
+            if lng and lat and not (math.isnan(lng) or math.isnan(lat)):
+                yield [lng, lat]
+
+    def records(self):
+        """rows as dicts with the process_input keys; speed and course are written back as the transmitted strings"""
+        for ts, lat, lng, speed, course, status, speed_digits, course_digits in zip(*self.columns):
+            record = {'timestamp': ts}
+            if status:
+                record['RMC_status'] = chr(status)
+            if not math.isnan(lat):
+                record['RMC_lat'] = lat
+            if not math.isnan(lng):
+                record['RMC_lng'] = lng
+            if not math.isnan(speed):
+                record['RMC_speed'] = _str(speed, speed_digits)
+            if not math.isnan(course):
+                record['RMC_angle'] = _str(course, course_digits)
+            yield record
+
+    def as_numpy(self):
+        """the columns as numpy arrays sharing memory with this track (numpy is optional)"""
+        if numpy is None:
+            raise RuntimeError('numpy is not installed')
+        return {name: numpy.frombuffer(c, dtype=typecode) for (name, typecode), c in zip(COLUMNS, self.columns)}
+
+    def nbytes(self):
+        return sum(len(c) * memoryview(c).itemsize for c in self.columns)